@@ -0,0 +1,233 @@
+from pyglet.media import load as mload, Player
+from pyglet.media.codecs.base import Source, StreamingSource, AudioData, AudioFormat
+from pyglet.media.exceptions import MediaException
+from collections import deque
+import pyglet.clock
+import logging
+import struct
+import mmap
+import os
+
+logger = logging.getLogger(__name__)
+
+# when the same sound ships in several formats, decode the cheapest one
+FORMATS = (".wav", ".ogg", ".mp3")
+
+# decoded sounds are kept here as raw PCM, so they never need decoding twice
+CACHE_DIR = ".audio_cache"
+
+# cache file header: magic, source mtime, source size, channels,
+# sample size and sample rate
+HEADER = struct.Struct("<4sqqHHI")
+MAGIC = b"PCM1"
+
+# bytes handed to a player at a time when streaming from the cache
+CHUNK_SIZE = 1 << 16
+
+
+# plays decoded PCM straight out of a (memory-mapped) cache file
+class CachedStream(StreamingSource):
+    def __init__(self, data, audio_format):
+        self._data = data
+        self._offset = 0
+        self.audio_format = audio_format
+        self._duration = len(data) / audio_format.bytes_per_second
+
+    def seek(self, timestamp):
+        offset = int(timestamp * self.audio_format.bytes_per_second)
+        # always land on the start of a sample
+        self._offset = offset - offset % self.audio_format.bytes_per_sample
+
+    def get_audio_data(self, num_bytes, compensation_time=0.0):
+        num_bytes = min(num_bytes, CHUNK_SIZE)
+        num_bytes -= num_bytes % self.audio_format.bytes_per_sample
+        # copy just this chunk out of the map, audio drivers want bytes
+        chunk = self._data[self._offset:self._offset + num_bytes].tobytes()
+        if len(chunk) == 0:
+            return None
+
+        rate = self.audio_format.bytes_per_second
+        timestamp = self._offset / rate
+        self._offset += len(chunk)
+        return AudioData(chunk, len(chunk), timestamp, len(chunk) / rate, [])
+
+
+# a decoded sound effect that can be queued on many players at once,
+# every player streams from the same shared memory map
+class CachedSound(Source):
+    def __init__(self, data, audio_format):
+        self._data = data
+        self.audio_format = audio_format
+        self._duration = len(data) / audio_format.bytes_per_second
+
+    def get_queue_source(self):
+        return CachedStream(self._data, self.audio_format)
+
+
+def _candidates(filename):
+    # the file itself plus any other format of it sitting next to it,
+    # cheapest to decode first
+    stem, ext = os.path.splitext(filename)
+    names = [stem + other for other in FORMATS if os.path.exists(stem + other)]
+    if filename not in names and os.path.exists(filename):
+        names.append(filename)
+    return names
+
+
+def _cache_path(filename):
+    stem = os.path.splitext(os.path.normpath(filename))[0]
+    return os.path.join(CACHE_DIR, stem.replace(os.sep, "_") + ".pcm")
+
+
+def _open_cache(path, sources):
+    # returns the mapped PCM data and format if the cache file is still
+    # up to date with one of the source files, otherwise None
+    try:
+        with open(path, "rb") as file:
+            header = file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return None
+            magic, mtime, size, channels, sample_size, rate = HEADER.unpack(header)
+            fresh = any(os.stat(source).st_mtime_ns == mtime and
+                        os.stat(source).st_size == size for source in sources)
+            if magic != MAGIC or not fresh:
+                return None
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    # skip past the header without copying the PCM data
+    return memoryview(data)[HEADER.size:], AudioFormat(channels, sample_size, rate)
+
+
+def _decode_to_cache(source_name, path):
+    # decode the whole file once and write the raw PCM to the cache
+    source = mload(source_name, streaming=True)
+    audio_format = source.audio_format
+    if audio_format is None:
+        raise MediaException("{} has no audio".format(source_name))
+
+    stat = os.stat(source_name)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # write to a temporary file first so a crash never leaves half a cache
+    with open(path + ".tmp", "wb") as file:
+        file.write(HEADER.pack(MAGIC, stat.st_mtime_ns, stat.st_size,
+                               audio_format.channels, audio_format.sample_size,
+                               audio_format.sample_rate))
+        while True:
+            audio_data = source.get_audio_data(CHUNK_SIZE)
+            if not audio_data:
+                break
+            file.write(audio_data.get_string_data())
+    source.delete()
+    os.replace(path + ".tmp", path)
+
+
+def _load_cached(filename):
+    sources = _candidates(filename)
+    if len(sources) == 0:
+        raise MediaException("{} not found".format(filename))
+
+    path = _cache_path(filename)
+    cached = _open_cache(path, sources)
+    if cached is not None:
+        return cached
+
+    # nothing usable in the cache, decode the cheapest format that works
+    error = None
+    for source_name in sources:
+        try:
+            _decode_to_cache(source_name, path)
+            return _open_cache(path, [source_name])
+        except MediaException as e:
+            error = error or e
+    raise error
+
+
+def load_sound(filename):
+    # a sound effect that can be played on any number of players
+    return CachedSound(*_load_cached(filename))
+
+
+def load_music(filename):
+    # a long track, streamed from the cache a chunk at a time
+    return CachedStream(*_load_cached(filename))
+
+
+# plays sound effects through a fixed set of reusable Players, instead
+# of letting every .play() call create a brand new Player.
+# for headless runs, set pyglet.options["audio"] = ("silent",) before
+# anything from pyglet.media is imported, or pass enabled=False
+class Mixer:
+    def __init__(self, voices_per_sound=4, max_voices=16, enabled=True):
+        self.voices_per_sound = voices_per_sound
+        # the most sounds that can be playing at the same time
+        self.max_voices = max_voices
+        self.enabled = enabled
+
+        # name -> file of sounds that haven't been needed yet
+        self.files = {}
+        # name -> decoded sound
+        self.sounds = {}
+        # name -> Players for that sound, the one that started
+        # playing longest ago is always at the front
+        self.pools = {}
+        # sounds requested this frame, played together at the end of it
+        self._requests = []
+
+    def load(self, name, filename):
+        # only remember the file, it is decoded the first time it plays
+        if self.enabled:
+            self.files[name] = filename
+
+    def _get_sound(self, name):
+        # sounds that are missing or can't be decoded are left out, and
+        # playing them does nothing, so the game still runs without them.
+        # the file is only tried once, so the warning shows up once per sound
+        if name in self.files:
+            filename = self.files.pop(name)
+            try:
+                self.sounds[name] = load_sound(filename)
+                self.pools[name] = deque(Player() for _ in range(self.voices_per_sound))
+            except MediaException as e:
+                logger.warning("Sound %r is muted, could not load %s: %s", name, filename, e)
+        return self.sounds.get(name)
+
+    def play(self, name):
+        if self._get_sound(name) is None:
+            return
+        # the first request of a frame schedules the flush
+        if not self._requests:
+            pyglet.clock.schedule_once(self._flush, 0)
+        # asking for the same sound twice in one frame only plays it once
+        if name not in self._requests:
+            self._requests.append(name)
+
+    def active_voices(self):
+        return sum(1 for pool in self.pools.values()
+                   for voice in pool if voice.source is not None)
+
+    def _flush(self, _):
+        requests, self._requests = self._requests, []
+        active = self.active_voices()
+
+        for name in requests:
+            pool = self.pools[name]
+            # prefer a voice that has finished playing
+            voice = next((v for v in pool if v.source is None), None)
+            if voice is None:
+                # all busy: cut off the oldest one and reuse it,
+                # which doesn't change the number of voices playing
+                voice = pool[0]
+                voice.next_source()
+            elif active >= self.max_voices:
+                # too many sounds at once, skip this one
+                continue
+            else:
+                active += 1
+
+            # move the voice to the back, it is now the newest
+            pool.remove(voice)
+            pool.append(voice)
+
+            voice.queue(self.sounds[name])
+            voice.play()
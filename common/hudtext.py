@@ -0,0 +1,100 @@
+from cocos.cocosnode import CocosNode
+from pyglet.gl import GL_QUADS, glPushMatrix, glPopMatrix
+import pyglet.graphics
+import pyglet.clock
+import pyglet.font
+
+# characters that are rendered up front, everything a score needs
+DIGITS = "0123456789-"
+
+
+# a text node for HUD values that change often, like the score.
+# the glyphs are rendered into the font's texture atlas once, and
+# changing the value only rewrites the characters that are different
+# instead of laying out the whole text again like a Label does
+class GlyphText(CocosNode):
+    def __init__(self, prefix="", font_name=None, font_size=18, max_chars=16,
+                 anchor_x="left", anchor_y="bottom", color=(255, 255, 255, 255)):
+        super().__init__()
+        self.prefix = prefix
+        # not anchor_x/anchor_y, those are CocosNode's transform anchor
+        self.text_anchor_x = anchor_x
+        self.text_anchor_y = anchor_y
+        self.max_chars = max_chars
+
+        # seconds to wait before showing a new value, 0 means next frame
+        self.refresh_interval = 0.0
+
+        # pre-render every glyph this label will ever need
+        self.font = pyglet.font.load(font_name, font_size)
+        charset = DIGITS + "".join(sorted(set(prefix) - set(DIGITS)))
+        self.glyphs = dict(zip(charset, self.font.get_glyphs(charset)))
+        # all of the glyphs live in the same atlas texture
+        texture = self.glyphs[DIGITS[0]].owner
+
+        # one quad (4 vertices) per character, in a single vertex list
+        self.batch = pyglet.graphics.Batch()
+        group = pyglet.graphics.TextureGroup(texture)
+        self.vertex_list = self.batch.add(max_chars * 4, GL_QUADS, group,
+                                          "v2f/dynamic", "t3f/dynamic",
+                                          ("c4B/static", color * (max_chars * 4)))
+
+        # the text currently on screen and the one waiting to be shown
+        self._text = ""
+        self._pending = None
+        # where each character's quad was put, to tell which ones moved
+        self._pens = [None] * max_chars
+
+    def set_value(self, value):
+        # remember the newest value, but only do the work once per frame
+        # no matter how many times the value changes before then
+        if self._pending is None:
+            pyglet.clock.schedule_once(self._flush, self.refresh_interval)
+        self._pending = "{}{}".format(self.prefix, value)[:self.max_chars]
+
+    def _flush(self, _):
+        text, self._pending = self._pending, None
+        if text is None or text == self._text:
+            return
+
+        # a character's quad only needs rewriting if the character changed
+        # or it moved. everything moves when the text is centered and its
+        # width changes, or when a digit is narrower than the one before it
+        pen_x, pen_y = self._origin(text)
+        for i in range(self.max_chars):
+            char = text[i] if i < len(text) else None
+            old = self._text[i] if i < len(self._text) else None
+            glyph = self.glyphs.get(char)
+            if char != old or self._pens[i] != (pen_x, pen_y):
+                self._set_quad(i, glyph, pen_x, pen_y)
+                self._pens[i] = (pen_x, pen_y)
+            if glyph is not None:
+                pen_x += glyph.advance
+        self._text = text
+
+    def _origin(self, text):
+        # where the first glyph's baseline starts, based on the anchors
+        width = sum(self.glyphs[c].advance for c in text if c in self.glyphs)
+        x = {"left": 0, "center": -width * 0.5, "right": -width}[self.text_anchor_x]
+        y = {"bottom": -self.font.descent,
+             "center": -(self.font.ascent + self.font.descent) * 0.5,
+             "top": -self.font.ascent}[self.text_anchor_y]
+        return x, y
+
+    def _set_quad(self, i, glyph, x, y):
+        if glyph is None:
+            # empty slot, collapse the quad so nothing is drawn
+            self.vertex_list.vertices[i * 8:i * 8 + 8] = [0] * 8
+            return
+        left, bottom, right, top = glyph.vertices
+        self.vertex_list.vertices[i * 8:i * 8 + 8] = [
+            x + left, y + bottom, x + right, y + bottom,
+            x + right, y + top, x + left, y + top]
+        self.vertex_list.tex_coords[i * 12:i * 12 + 12] = glyph.tex_coords
+
+    def draw(self):
+        # draw relative to this node's position, like cocos Labels do
+        glPushMatrix()
+        self.transform()
+        self.batch.draw()
+        glPopMatrix()
@@ -0,0 +1,138 @@
+from cocos.cocosnode import CocosNode
+from pyglet.gl import GL_QUADS, glPushMatrix, glPopMatrix, glEnable, glDisable, glBindTexture
+from pyglet.image import ImageGrid, TextureGrid, load
+import pyglet.graphics
+import numpy as np
+
+# corners of a quad around its center, in the order pyglet draws them
+CORNERS = np.array([(-1, -1), (1, -1), (1, 1), (-1, 1)], dtype=np.float32)
+
+
+def load_frames(filename, rows, columns):
+    # cut a sprite sheet into frames that all share one texture
+    return list(TextureGrid(ImageGrid(load(filename), rows, columns)))
+
+
+# thousands of short-lived effects (explosions, sparks, debris) kept in
+# numpy arrays, moved together in one step per frame and drawn from a
+# single vertex list, instead of one Sprite with its own actions each
+class ParticleSystem(CocosNode):
+    def __init__(self, frames=None, frame_duration=0.07, capacity=1024):
+        super().__init__()
+        # every frame must come from the same texture (or use no texture
+        # for plain colored squares)
+        self.frames = frames
+        self.frame_duration = frame_duration
+        self.texture = frames[0].owner if frames else None
+        if frames:
+            self.frame_coords = np.array([frame.tex_coords for frame in frames],
+                                         dtype=np.float32)
+
+        # fraction of requested particles that are actually emitted,
+        # lowered to save time when the game is running slowly
+        self.density = 1.0
+
+        # number of live particles, always packed at the front of the arrays
+        self.count = 0
+        self._allocate(capacity)
+        self.schedule(self.step)
+
+    def _allocate(self, capacity):
+        # grow every array (keeping live particles) and the vertex list
+        old = self.count
+        def grow(array, shape, dtype):
+            new = np.zeros((capacity,) + shape, dtype=dtype)
+            if array is not None:
+                new[:old] = array[:old]
+            return new
+        self.positions = grow(getattr(self, "positions", None), (2,), np.float32)
+        self.velocities = grow(getattr(self, "velocities", None), (2,), np.float32)
+        self.age = grow(getattr(self, "age", None), (), np.float32)
+        self.lifetime = grow(getattr(self, "lifetime", None), (), np.float32)
+        self.size = grow(getattr(self, "size", None), (), np.float32)
+        self.color = grow(getattr(self, "color", None), (4,), np.uint8)
+        self.fade = grow(getattr(self, "fade", None), (), bool)
+        self.capacity = capacity
+
+        if getattr(self, "vertex_list", None) is not None:
+            self.vertex_list.delete()
+        self.vertex_list = pyglet.graphics.vertex_list(
+            capacity * 4, "v2f/stream", "t3f/stream", "c4B/stream")
+
+    def emit(self, x, y, count=1, speed=0.0, lifetime=1.0, size=16.0,
+             color=(255, 255, 255, 255), fade=False):
+        # add `count` particles at (x, y), flying off in random directions
+        count = int(np.ceil(count * self.density))
+        if count <= 0:
+            return
+        if self.count + count > self.capacity:
+            self._allocate(max(self.capacity * 2, self.count + count))
+
+        new = slice(self.count, self.count + count)
+        angles = np.random.uniform(0, 2 * np.pi, count)
+        speeds = np.random.uniform(0.5, 1.0, count) * speed
+        self.positions[new] = (x, y)
+        self.velocities[new, 0] = np.cos(angles) * speeds
+        self.velocities[new, 1] = np.sin(angles) * speeds
+        self.age[new] = 0
+        self.lifetime[new] = lifetime
+        self.size[new] = size
+        self.color[new] = color
+        self.fade[new] = fade
+        self.count += count
+
+    def step(self, delta_time):
+        n = self.count
+        if n == 0:
+            return
+
+        # move and age every particle at once
+        self.age[:n] += delta_time
+        self.positions[:n] += self.velocities[:n] * delta_time
+
+        # drop the dead ones by packing the live ones to the front
+        alive = self.age[:n] < self.lifetime[:n]
+        if not alive.all():
+            keep = np.flatnonzero(alive)
+            for array in (self.positions, self.velocities, self.age,
+                          self.lifetime, self.size, self.color, self.fade):
+                array[:len(keep)] = array[keep]
+            self.count = len(keep)
+        self._update_vertices(n)
+
+    def _update_vertices(self, previous_count):
+        n = self.count
+        # write straight into the vertex list's memory
+        vertices = np.ctypeslib.as_array(self.vertex_list.vertices).reshape(-1, 4, 2)
+        vertices[:n] = self.positions[:n, None, :] + \
+            CORNERS[None, :, :] * (self.size[:n, None, None] * 0.5)
+        # collapse the quads of particles that died since last frame
+        vertices[n:previous_count] = 0
+
+        colors = np.ctypeslib.as_array(self.vertex_list.colors).reshape(-1, 4, 4)
+        colors[:n] = self.color[:n, None, :]
+        # fading particles get more see-through as they age
+        fading = np.flatnonzero(self.fade[:n])
+        if len(fading):
+            left = 1 - self.age[fading] / self.lifetime[fading]
+            colors[fading, :, 3] = (self.color[fading, 3] * left)[:, None]
+
+        if self.frames:
+            # pick each particle's animation frame from its age
+            frame = np.minimum((self.age[:n] / self.frame_duration).astype(np.int32),
+                               len(self.frames) - 1)
+            coords = np.ctypeslib.as_array(self.vertex_list.tex_coords).reshape(-1, 12)
+            coords[:n] = self.frame_coords[frame]
+
+    def draw(self):
+        if self.count == 0:
+            return
+        glPushMatrix()
+        self.transform()
+        if self.texture is not None:
+            glEnable(self.texture.target)
+            glBindTexture(self.texture.target, self.texture.id)
+        self.vertex_list.draw(GL_QUADS)
+        if self.texture is not None:
+            glDisable(self.texture.target)
+        glPopMatrix()
@@ -0,0 +1,22 @@
+from cocos.sprite import Sprite
+from cocos.euclid import Vector2
+from cocos.collision_model import CircleShape
+
+
+# the ball used for the player and the pickups, shared by the small
+# world in game.py and the large world in chunks.py
+class Actor(Sprite):
+    def __init__(self, x, y, color):
+        # call the Sprite constructor with initial params
+        super().__init__("img/ball.png", color=color)
+
+        # create a vector that defines the sprite's position
+        # relative to the screen's origin (bottom left)
+        pos = Vector2(x, y)
+        self.position = pos
+
+        # create a circle shaped collider centered on the sprite
+        self.cshape = CircleShape(pos, self.width / 2)
+
+        # the actor should move 100 pixels per second
+        self.speed = 100
@@ -0,0 +1,172 @@
+from cocos.batch import BatchNode
+from cocos.layer import Layer, ScrollableLayer, ScrollingManager
+from cocos.collision_model import CollisionManagerGrid
+from cocos.director import director
+from cocos.scene import Scene
+from cocos.text import Label
+from collections import OrderedDict
+from pyglet.window import key
+from random import Random
+from actors import Actor
+
+# the world is split into square chunks, 100 x 100 of them
+CHUNK_SIZE = 512
+WORLD_CHUNKS = 100
+WORLD_SIZE = CHUNK_SIZE * WORLD_CHUNKS
+# 40 pickups per chunk is 400,000 pickups in the world
+PICKUPS_PER_CHUNK = 40
+TOTAL_PICKUPS = WORLD_CHUNKS * WORLD_CHUNKS * PICKUPS_PER_CHUNK
+# chunks around the player's chunk that must be loaded: 1 means a 3 x 3
+# block, which is more than the window shows
+VIEW_RADIUS = 1
+# the most chunks kept loaded, the least recently used go first
+MAX_LOADED = 25
+# the same seed always makes the same world
+SEED = 2018
+
+
+# one bit per pickup in the world, set once it's collected. this is all
+# that is remembered about a chunk after it is unloaded (50 KB in total)
+class CollectedBits:
+    def __init__(self, count):
+        self.bits = bytearray((count + 7) // 8)
+        self.count = 0
+
+    def __contains__(self, index):
+        return self.bits[index >> 3] >> (index & 7) & 1
+
+    def add(self, index):
+        if index not in self:
+            self.bits[index >> 3] |= 1 << (index & 7)
+            self.count += 1
+
+
+def chunk_pickups(cx, cy, seed=SEED):
+    # the pickups of a chunk are made up from its coordinates, so a chunk
+    # comes back exactly the same every time it's loaded
+    rng = Random((seed * WORLD_CHUNKS + cx) * WORLD_CHUNKS + cy)
+    x0, y0 = cx * CHUNK_SIZE, cy * CHUNK_SIZE
+    return [(x0 + rng.uniform(16, CHUNK_SIZE - 16), y0 + rng.uniform(16, CHUNK_SIZE - 16))
+            for _ in range(PICKUPS_PER_CHUNK)]
+
+
+# the sprites and collision entries of one chunk, only while it's loaded
+class Chunk:
+    def __init__(self, cx, cy, collected):
+        # the number of this chunk's first pickup in the collected bits
+        first = (cy * WORLD_CHUNKS + cx) * PICKUPS_PER_CHUNK
+        # all the chunk's sprites are drawn together
+        self.batch = BatchNode()
+        # pickups don't move, so they go into the chunk's own grid once,
+        # instead of clearing and refilling one grid every frame
+        x0, y0 = cx * CHUNK_SIZE, cy * CHUNK_SIZE
+        self.collman = CollisionManagerGrid(x0, x0 + CHUNK_SIZE, y0, y0 + CHUNK_SIZE, 64, 64)
+
+        for i, (x, y) in enumerate(chunk_pickups(cx, cy)):
+            if first + i in collected:
+                continue
+            pickup = Actor(x, y, (255, 0, 0))
+            pickup.index = first + i
+            self.batch.add(pickup)
+            self.collman.add(pickup)
+
+    def collect(self, pickup, collected):
+        collected.add(pickup.index)
+        self.collman.remove_tricky(pickup)
+        self.batch.remove(pickup)
+
+
+class LargeWorldLayer(ScrollableLayer):
+    def __init__(self, keyboard, hud):
+        super().__init__()
+        self.keyboard = keyboard
+        # the HUD shows how many pickups were collected
+        self.hud = hud
+        # the ScrollingManager won't scroll past these
+        self.px_width = WORLD_SIZE
+        self.px_height = WORLD_SIZE
+
+        self.collected = CollectedBits(TOTAL_PICKUPS)
+        # loaded chunks by (column, row), the least recently used first
+        self.chunks = OrderedDict()
+        self.current_chunk = None
+
+        # start in the middle of the world, above the pickups
+        self.player = Actor(WORLD_SIZE / 2, WORLD_SIZE / 2, (0, 0, 255))
+        self.add(self.player, z=1)
+
+        self.schedule(self.update)
+
+    def load_chunks_around(self, x, y):
+        cx, cy = int(x // CHUNK_SIZE), int(y // CHUNK_SIZE)
+        # nothing changes until the player moves into another chunk
+        if (cx, cy) == self.current_chunk:
+            return
+        self.current_chunk = (cx, cy)
+
+        for column in range(max(cx - VIEW_RADIUS, 0), min(cx + VIEW_RADIUS + 1, WORLD_CHUNKS)):
+            for row in range(max(cy - VIEW_RADIUS, 0), min(cy + VIEW_RADIUS + 1, WORLD_CHUNKS)):
+                if (column, row) in self.chunks:
+                    # used again, so it's the last one to be unloaded
+                    self.chunks.move_to_end((column, row))
+                else:
+                    chunk = self.chunks[column, row] = Chunk(column, row, self.collected)
+                    self.add(chunk.batch)
+
+        # unload the chunks that were needed longest ago, the ones around
+        # the player were just moved to the end so they always stay
+        while len(self.chunks) > MAX_LOADED:
+            _, chunk = self.chunks.popitem(last=False)
+            self.remove(chunk.batch)
+
+    def update(self, delta_time):
+        # the same movement as the MainLayer
+        horizontal_movement = self.keyboard[key.RIGHT] - self.keyboard[key.LEFT]
+        vertical_movement = self.keyboard[key.UP] - self.keyboard[key.DOWN]
+        x, y = self.player.position
+        step = self.player.speed * delta_time
+        # but the world has edges
+        x = min(max(x + horizontal_movement * step, 0), WORLD_SIZE)
+        y = min(max(y + vertical_movement * step, 0), WORLD_SIZE)
+        self.player.position = (x, y)
+        self.player.cshape.center = self.player.position
+
+        self.load_chunks_around(x, y)
+
+        # only the chunks the player overlaps can have pickups to collect
+        minx, maxx, miny, maxy = self.player.cshape.minmax()
+        before = self.collected.count
+        for column in range(int(minx // CHUNK_SIZE), int(maxx // CHUNK_SIZE) + 1):
+            for row in range(int(miny // CHUNK_SIZE), int(maxy // CHUNK_SIZE) + 1):
+                chunk = self.chunks.get((column, row))
+                if chunk is None:
+                    continue
+                for pickup in list(chunk.collman.iter_colliding(self.player)):
+                    chunk.collect(pickup, self.collected)
+        if self.collected.count != before:
+            self.hud.update_collected(self.collected.count)
+
+        # the camera follows the player
+        self.parent.set_focus(x, y)
+
+
+# the number of pickups collected, fixed on the screen
+class HUD(Layer):
+    def __init__(self):
+        super().__init__()
+        w, h = director.get_window_size()
+        self.text = Label("", font_size=14, position=(10, h - 24))
+        self.add(self.text)
+        self.update_collected(0)
+
+    def update_collected(self, count):
+        self.text.element.text = "Collected: {} / {}".format(count, TOTAL_PICKUPS)
+
+
+def new_large_world_scene(keyboard):
+    hud = HUD()
+    layer = LargeWorldLayer(keyboard, hud)
+    # the scrolling manager moves the world under the window
+    scroller = ScrollingManager()
+    scroller.add(layer)
+    return Scene(scroller, hud)
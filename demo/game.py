@@ -1,27 +1,10 @@
-from cocos.sprite import Sprite
-from cocos.euclid import Vector2
-from cocos.collision_model import CollisionManagerGrid, CircleShape
+from cocos.collision_model import CollisionManagerGrid
 from cocos.layer import Layer
 from cocos.director import director
 from cocos.scene import Scene
 from pyglet.window import key
-
-
-class Actor(Sprite):
-    def __init__(self, x, y, color):
-        # call the Sprite constructor with initial params
-        super().__init__("img/ball.png", color=color)
-
-        # create a vector that defines the sprite's position
-        # relative to the screen's origin (bottom left)
-        pos = Vector2(x, y)
-        self.position = pos
-
-        # create a circle shaped collider centered on the sprite
-        self.cshape = CircleShape(pos, self.width / 2)
-
-        # the actor should move 100 pixels per second
-        self.speed = 100
+from actors import Actor
+import sys
 
 
 class MainLayer(Layer):
@@ -97,8 +80,13 @@ if __name__ == "__main__":
     keyboard = key.KeyStateHandler()
     director.window.push_handlers(keyboard)
 
-    # create the layer and scene
-    layer = MainLayer()
-    scene = Scene(layer)
+    if "--large-world" in sys.argv:
+        # a huge scrolling world, loaded a few chunks at a time
+        from chunks import new_large_world_scene
+        scene = new_large_world_scene(keyboard)
+    else:
+        # create the layer and scene
+        layer = MainLayer()
+        scene = Scene(layer)
     # director, run this scene
     director.run(scene)
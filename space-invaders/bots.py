@@ -0,0 +1,77 @@
+from game import Controls, AlienShoot
+from random import Random
+
+
+# presses random keys: moves one way for a while, then another way,
+# and fires now and then. good at finding the corners of the game
+class RandomBot(Controls):
+    def __init__(self, seed=None):
+        # its own random numbers, so the bot doesn't change when the
+        # aliens shoot
+        self.random = Random(seed)
+        self.direction = 0
+        self.frames_left = 0
+
+    def read(self, layer):
+        if self.frames_left <= 0:
+            self.direction = self.random.choice((-1, 0, 1))
+            self.frames_left = self.random.randint(10, 120)
+        self.frames_left -= 1
+        return self.direction, self.random.random() < 0.05
+
+
+# plays like a person would: gets out of the way of alien missiles,
+# otherwise lines up under the nearest column and fires. how well it
+# plays comes from the seed, so a soak test sees good and bad players
+class TrackingBot(Controls):
+    def __init__(self, seed=None, skill=None):
+        self.random = Random(seed)
+        # 0.0 plays badly, 1.0 never misses a missile
+        self.skill = self.random.uniform(0.0, 1.0) if skill is None else skill
+        # how far above the cannon a missile has to be to ignore it,
+        # worse players notice missiles later
+        self.dodge_height = 50 + 150 * self.skill
+        # worse players look at the game less often, in between they
+        # keep doing what they decided last
+        self.reaction_frames = 1 + round(20 * (1 - self.skill))
+        self.frames_left = 0
+        self.decision = (0, False)
+
+    def read(self, layer):
+        if self.frames_left <= 0:
+            self.decision = self._decide(layer)
+            self.frames_left = self.reaction_frames
+        self.frames_left -= 1
+        direction, firing = self.decision
+        # only fire once per decision
+        self.decision = direction, False
+        return direction, firing
+
+    def _decide(self, layer):
+        cannon = layer.player
+
+        for _, actor in layer.children:
+            if isinstance(actor, AlienShoot) and abs(actor.x - cannon.x) < cannon.width and \
+                    0 < actor.y - cannon.y < self.dodge_height:
+                # step away from the missile
+                return (1 if cannon.x >= actor.x else -1), False
+
+        # the bottom alien of every column that has any left
+        targets = [column.aliens[0] for column in layer.swarm.columns if column.aliens]
+        if not targets:
+            return 0, False
+        target = min(targets, key=lambda alien: abs(alien.x - cannon.x))
+        distance = target.x - cannon.x
+        # fire when lined up, with a little hesitation like a person
+        lined_up = abs(distance) < target.width * 0.5
+        firing = lined_up and self.random.random() < 0.5
+        if abs(distance) < 4:
+            return 0, firing
+        return (1 if distance > 0 else -1), firing
+
+
+# the bots the soak test can use, by name
+BOTS = {
+    "random": RandomBot,
+    "tracking": TrackingBot,
+}
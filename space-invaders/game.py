@@ -7,12 +7,31 @@ from cocos.scene import Scene
 from cocos.text import Label
 from pyglet.window import key
 from pyglet.image import load as iload, ImageGrid, Animation
-from pyglet.media import load as mload
 from random import random
+import logging
+import sys
+import os
 
-shoot_sfx = mload("sfx/shoot.mp3", streaming=False)
-kill_sfx = mload("sfx/invaderkilled.mp3", streaming=False)
-die_sfx = mload("sfx/explosion.mp3", streaming=False)
+# the HUD text, sounds and particles are shared with the tower defense
+# game, in the common folder next to this one
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.hudtext import GlyphText
+from common.audio import Mixer, load_music
+from common.particles import ParticleSystem
+from pyglet.media.exceptions import MediaException
+
+logger = logging.getLogger(__name__)
+
+# where F5 saves the game
+SAVE_FILE = "invaders.sav"
+
+# every sound effect plays through the mixer's pool of players,
+# the mixer decodes the .wav versions that sit next to the .mp3 files
+# the first time each one is played
+mixer = Mixer()
+mixer.load("shoot", "sfx/shoot.mp3")
+mixer.load("kill", "sfx/invaderkilled.mp3")
+mixer.load("die", "sfx/explosion.mp3")
 
 
 # utility function to create an animation from a sprite sheet
@@ -23,12 +42,23 @@ def load_animation(image):
     return Animation.from_image_sequence(seq, 0.5)
 
 
+# image file and points for each type of alien
 TYPES = {
-    "1": (load_animation("img/alien1.png"), 40),
-    "2": (load_animation("img/alien2.png"), 20),
-    "3": (load_animation("img/alien3.png"), 10)
+    "1": ("img/alien1.png", 40),
+    "2": ("img/alien2.png", 20),
+    "3": ("img/alien3.png", 10)
 }
 
+# animations are loaded the first time an alien of that type is created,
+# not when the module is imported
+_animations = {}
+
+
+def get_animation(alien_type):
+    if alien_type not in _animations:
+        _animations[alien_type] = load_animation(TYPES[alien_type][0])
+    return _animations[alien_type]
+
 
 # All game objects are sprites and can move, collide, etc.
 class Actor(Sprite):
@@ -66,7 +96,7 @@ class Actor(Sprite):
 class Alien(Actor):
     def __init__(self, x, y, alien_type, column=None):
         # get the tuple from the dictionary and unpack it
-        animation, points = TYPES[alien_type]
+        animation, points = get_animation(alien_type), TYPES[alien_type][1]
         # call Actor constructor with image and coordinates
         super().__init__(animation, x, y)
         # different aliens are worth different points
@@ -215,8 +245,8 @@ class PlayerCannon(Actor):
         self.kill()
 
     def update(self, delta_time):
-        # boolean math trick that results in -1, 0, or 1
-        horizontal_movement = keyboard[key.RIGHT] - keyboard[key.LEFT]
+        # ask the layer's controls (the keyboard, or a bot) what to do
+        horizontal_movement, is_firing = self.parent.controls.read(self.parent)
 
         # keep cannon on screen by restricting the x coordinate range
         left_edge = self.width * 0.5
@@ -228,8 +258,6 @@ class PlayerCannon(Actor):
         if left_edge <= self.x <= right_edge:
             self.move(self.speed * horizontal_movement * delta_time)
 
-        # is the space key down?
-        is_firing = keyboard[key.SPACE]
         # only one missile at a time!
         if PlayerShoot.ACTIVE_SHOOT is None and is_firing:
             # originate a new missile 50 pixels above the
@@ -237,7 +265,27 @@ class PlayerCannon(Actor):
             self.parent.add(PlayerShoot(self.x, self.y + 50))
 
             # play sound effect
-            shoot_sfx.play()
+            mixer.play("shoot")
+
+
+# where the cannon gets its orders from. this one never moves or fires,
+# KeyboardControls and the bots in bots.py decide for real
+class Controls:
+    # returns the horizontal movement (-1, 0 or 1) and whether to fire
+    def read(self, layer):
+        return 0, False
+
+
+# the player at the keyboard
+class KeyboardControls(Controls):
+    def __init__(self, keyboard):
+        self.keyboard = keyboard
+
+    def read(self, layer):
+        # boolean math trick that results in -1, 0, or 1
+        horizontal_movement = self.keyboard[key.RIGHT] - self.keyboard[key.LEFT]
+        # is the space key down?
+        return horizontal_movement, self.keyboard[key.SPACE]
 
 
 # the missile fired by the PlayerCannon
@@ -258,6 +306,9 @@ class PlayerShoot(Actor):
         if isinstance(other, Alien):
             # add however many points the Alien was worth to the score
             self.parent.update_score(other.points)
+            # blow the alien into little green pieces
+            self.parent.debris.emit(other.x, other.y, count=16, speed=150, lifetime=0.6,
+                                    size=4, color=(120, 255, 120, 255), fade=True)
             # remove both Alien and PlayerShoot from game
             other.kill()
             self.kill()
@@ -292,46 +343,58 @@ class HUD(Layer):
         # get the screen size and unpack the tuple into two variables
         w, h = director.get_window_size()
 
-        # create a label to hold the score
-        self.score_text = Label("", font_size=18)
+        # create a text to hold the score, only its digits get
+        # redrawn when the score changes
+        self.score_text = GlyphText("Score: ", font_size=18)
         # set the position as an (x, y) tuple
         self.score_text.position = (20, h - 40)
 
-        # create a label to hold the lives remaining
-        self.lives_text = Label("", font_size=18)
+        # create a text to hold the lives remaining
+        self.lives_text = GlyphText("Lives: ", font_size=18)
         # set the position as an (x, y) tuple
         self.lives_text.position = (w - 100, h - 40)
 
         # add both labels to the layer, making them visible
         self.add(self.score_text)
         self.add(self.lives_text)
+        # the "Game Over" label, once the game has ended
+        self.game_over_text = None
 
-    # method to update the score label
+    # method to update the score text
     def update_score(self, score):
-        self.score_text.element.text = "Score: {}".format(score)
+        self.score_text.set_value(score)
 
-    # method to update the lives label
+    # method to update the lives text
     def update_lives(self, lives):
-        self.lives_text.element.text = "Lives: {}".format(lives)
+        self.lives_text.set_value(lives)
 
     # method to create a "Game Over" label and add it to the layer
     def show_game_over(self, message):
         # get the screen size and unpack the tuple into two variables
         w, h = director.get_window_size()
-        game_over_text = Label(message, font_size=50, anchor_x="center", anchor_y="center")
+        self.game_over_text = Label(message, font_size=50, anchor_x="center", anchor_y="center")
 
         # position in center of screen
-        game_over_text.position = (w * 0.5, h * 0.5)
+        self.game_over_text.position = (w * 0.5, h * 0.5)
 
         # add to layer
-        self.add(game_over_text)
+        self.add(self.game_over_text)
+
+    # method to take the "Game Over" label away again, when a saved game
+    # is loaded after the game has ended
+    def hide_game_over(self):
+        if self.game_over_text is not None:
+            self.remove(self.game_over_text)
+            self.game_over_text = None
 
 
 class GameLayer(Layer):
-    def __init__(self, hud):
+    def __init__(self, hud, controls=None):
         super().__init__()
         # store reference to the hud so text labels can be updated
         self.hud = hud
+        # what moves the cannon, nobody if not given
+        self.controls = controls or Controls()
 
         # create variables for the screen width and height
         w, h = director.get_window_size()
@@ -354,6 +417,11 @@ class GameLayer(Layer):
         # create the alien swarm
         self.create_swarm(100, 300)
 
+        # every piece of debris is drawn by one particle system, which
+        # is not an Actor, so the game loop leaves it out of collisions
+        self.debris = ParticleSystem()
+        self.add(self.debris, z=1)
+
         # schedule the game loop to run every frame
         self.schedule(self.game_loop)
 
@@ -384,6 +452,8 @@ class GameLayer(Layer):
         # add back any actors that are still in the game
         # (children of the layer)
         for _, actor in self.children:
+            if not isinstance(actor, Actor):
+                continue
             self.collman.add(actor)
 
             # any Actors not on the collision grid should
@@ -395,12 +465,12 @@ class GameLayer(Layer):
         # check for missile impact
         if self.collide(PlayerShoot.ACTIVE_SHOOT):
             # play sound effect
-            kill_sfx.play()
+            mixer.play("kill")
 
         # if the cannon hit anything, respawn it
         if self.collide(self.player):
             # play sound effect
-            die_sfx.play()
+            mixer.play("die")
             # create a new PlayerCannon
             self.respawn_player()
 
@@ -414,7 +484,8 @@ class GameLayer(Layer):
 
         # update all Actors
         for _, actor in self.children:
-            actor.update(delta_time)
+            if isinstance(actor, Actor):
+                actor.update(delta_time)
         # also update the Swarm, which is not a child of the layer
         self.swarm.update(delta_time)
 
@@ -454,10 +525,14 @@ class GameLayer(Layer):
 
 
 if __name__ == "__main__":
-    # load sound media files
-    song = mload("sfx/level1.mp3")
-    player = song.play()
-    player.loop = True
+    # stream the music from the decoded audio cache, if this machine
+    # can decode any of its formats
+    try:
+        song = load_music("sfx/level1.mp3")
+        player = song.play()
+        player.loop = True
+    except MediaException as e:
+        logger.warning("Playing without music, could not load sfx/level1.mp3: %s", e)
 
     # init the Cocos director
     director.init(caption="WCTC Invaders", width=800, height=650)
@@ -473,9 +548,23 @@ if __name__ == "__main__":
     hud_layer = HUD()
     main_scene.add(hud_layer, z=1)
 
-    # create the game layer as the bottom layer (lower z axis)
-    game_layer = GameLayer(hud_layer)
+    # create the game layer as the bottom layer (lower z axis),
+    # with the player at the keyboard moving the cannon
+    game_layer = GameLayer(hud_layer, KeyboardControls(keyboard))
     main_scene.add(game_layer, z=0)
 
+    # snapshot.py imports its classes from "game". this file is running
+    # as "__main__", so point "game" at it instead of loading it twice
+    sys.modules["game"] = sys.modules["__main__"]
+    import snapshot
+
+    # F5 saves the game, F9 carries on from the last save
+    def on_key_press(symbol, modifiers):
+        if symbol == key.F5:
+            snapshot.save(game_layer, SAVE_FILE)
+        elif symbol == key.F9 and os.path.exists(SAVE_FILE):
+            snapshot.load(game_layer, SAVE_FILE)
+    director.window.push_handlers(on_key_press)
+
     # run it!
     director.run(main_scene)
@@ -0,0 +1,117 @@
+from game import Actor, Alien, AlienColumn, AlienShoot, PlayerCannon, PlayerShoot, TYPES
+import random
+import struct
+
+# the fixed part of a snapshot: magic, lives, score, swarm direction,
+# swarm elapsed time, player alive, player x and y, player missile flying,
+# missile x and y, number of alien missiles and of columns, then the
+# random module's state (624 numbers, the position in them, and the
+# cached gauss value)
+HEADER = struct.Struct("<4sbibd?dd?ddHH")
+MAGIC = b"SIS1"
+RANDOM_STATE = struct.Struct("<624II?d")
+POSITION = struct.Struct("<dd")
+# x, y and alien type
+ALIEN = struct.Struct("<ddB")
+# alien types by their points, which is what an Alien remembers
+TYPE_BY_POINTS = {points: int(alien_type) for alien_type, (_, points) in TYPES.items()}
+
+
+def snapshot(layer):
+    # the whole game in a compact bytes object: everything that decides
+    # what happens next, but not effects like debris or sounds
+    player = layer.player
+    # a killed cannon is left out of the layer until it respawns
+    player_alive = player.parent is not None
+    shoot = PlayerShoot.ACTIVE_SHOOT
+    alien_shoots = [actor for _, actor in layer.children if isinstance(actor, AlienShoot)]
+    swarm = layer.swarm
+
+    parts = [HEADER.pack(MAGIC, layer.lives, layer.score, swarm.direction, swarm.elapsed,
+                         player_alive, player.x, player.y, shoot is not None,
+                         shoot.x if shoot else 0, shoot.y if shoot else 0,
+                         len(alien_shoots), len(swarm.columns))]
+
+    version, numbers, gauss = random.getstate()
+    parts.append(RANDOM_STATE.pack(*numbers, gauss is not None, gauss or 0.0))
+
+    for actor in alien_shoots:
+        parts.append(POSITION.pack(actor.x, actor.y))
+    for column in swarm.columns:
+        parts.append(struct.pack("<B", len(column.aliens)))
+        for alien in column.aliens:
+            parts.append(ALIEN.pack(alien.x, alien.y, TYPE_BY_POINTS[alien.points]))
+    return b"".join(parts)
+
+
+def _column(aliens):
+    # a column holding the given aliens, without the constructor that
+    # would make a fresh column of five
+    column = AlienColumn.__new__(AlienColumn)
+    column.aliens = [Alien(x, y, str(alien_type), column) for x, y, alien_type in aliens]
+    return column
+
+
+def restore(layer, blob):
+    # replace every actor in the layer with the ones in the snapshot
+    (magic, lives, score, direction, elapsed, player_alive, player_x, player_y,
+     shooting, shoot_x, shoot_y, alien_shoot_count, column_count) = HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError("not a space invaders snapshot")
+    offset = HEADER.size
+
+    *numbers, has_gauss, gauss = RANDOM_STATE.unpack_from(blob, offset)
+    random.setstate((3, tuple(numbers), gauss if has_gauss else None))
+    offset += RANDOM_STATE.size
+
+    for actor in [actor for _, actor in layer.children if isinstance(actor, Actor)]:
+        layer.remove(actor)
+    # on_exit() only clears this while the layer is running
+    PlayerShoot.ACTIVE_SHOOT = None
+
+    for _ in range(alien_shoot_count):
+        layer.add(AlienShoot(*POSITION.unpack_from(blob, offset)))
+        offset += POSITION.size
+
+    columns = []
+    for _ in range(column_count):
+        (count,) = struct.unpack_from("<B", blob, offset)
+        offset += 1
+        columns.append(_column(ALIEN.unpack_from(blob, offset + i * ALIEN.size)
+                               for i in range(count)))
+        offset += count * ALIEN.size
+    layer.swarm.columns = columns
+    layer.swarm.direction = direction
+    layer.swarm.elapsed = elapsed
+    for alien in layer.swarm:
+        layer.add(alien)
+
+    layer.player = PlayerCannon(player_x, player_y)
+    if player_alive:
+        layer.add(layer.player)
+    if shooting:
+        # the new missile becomes the ACTIVE_SHOOT again
+        layer.add(PlayerShoot(shoot_x, shoot_y))
+
+    layer.lives = lives
+    layer.score = score
+    layer.hud.update_score(score)
+    layer.hud.update_lives(lives)
+    layer.hud.hide_game_over()
+
+    # the game loop stops at game over, and starts again when going
+    # back to before it
+    layer.unschedule(layer.game_loop)
+    if lives >= 0:
+        layer.schedule(layer.game_loop)
+
+
+def save(layer, filename):
+    # keep a long game to carry on with later
+    with open(filename, "wb") as file:
+        file.write(snapshot(layer))
+
+
+def load(layer, filename):
+    with open(filename, "rb") as file:
+        restore(layer, file.read())
@@ -0,0 +1,147 @@
+from collections import Counter
+import multiprocessing
+import statistics
+import argparse
+import random
+import time
+import sys
+import os
+
+# one game step, the same as 60 frames per second
+DT = 1 / 60.0
+
+# set up once in every worker process by _start_worker()
+game = None
+bots = None
+Scene = None
+
+
+def _start_worker():
+    global game, bots, Scene
+    # the images are loaded relative to the game's directory
+    here = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(here)
+    sys.path.insert(0, here)
+
+    # sprites need an OpenGL context for their textures, so there is a
+    # window, but it is never shown. on a machine without a display,
+    # run under xvfb-run or set PYGLET_HEADLESS=1 to use EGL instead
+    from cocos.director import director
+    director.init(visible=False, width=800, height=650)
+
+    from cocos.scene import Scene
+    import game
+    import bots
+    # game.py has put the common folder on the path
+    from common.audio import Mixer
+    # no sounds, and no debris to keep track of, nobody is watching
+    game.mixer = Mixer(enabled=False)
+
+
+def _find_leaks(layer, leaks):
+    # a missile that left the game but still blocks the player from firing
+    shoot = game.PlayerShoot.ACTIVE_SHOOT
+    if shoot is not None and shoot.parent is None:
+        leaks["stuck ACTIVE_SHOOT"] += 1
+    # aliens that were destroyed but are still in their column, they
+    # keep the column turning and shooting
+    for alien in layer.swarm:
+        if alien.parent is None:
+            leaks["orphaned AlienColumn entry"] += 1
+    # a cannon that got past the edge, where it can't move any more
+    cannon = layer.player
+    if cannon.parent is not None and \
+            not cannon.width * 0.5 <= cannon.x <= layer.width - cannon.width * 0.5:
+        leaks["cannon outside the screen edges"] += 1
+
+
+def play_game(job):
+    seed, bot_name, max_frames = job
+    # the aliens' shots use the random module
+    random.seed(seed)
+    hud = game.HUD()
+    layer = game.GameLayer(hud, bots.BOTS[bot_name](seed))
+    layer.debris.density = 0
+    # entering the scene marks every node as running, like the director
+    # would, so kill() and on_exit() clean up the same way as in the game
+    scene = Scene()
+    scene.add(hud, z=1)
+    scene.add(layer, z=0)
+    scene.on_enter()
+
+    def aliens_left():
+        return any(column.aliens for column in layer.swarm.columns)
+
+    leaks = Counter()
+    frames = 0
+    # the game has no winning screen, it ends when the swarm is gone
+    while frames < max_frames and layer.lives >= 0 and aliens_left():
+        # step straight away instead of waiting for the next frame
+        layer.game_loop(DT)
+        frames += 1
+        _find_leaks(layer, leaks)
+
+    if layer.lives < 0:
+        result = "game over"
+    elif not aliens_left():
+        result = "swarm destroyed"
+    else:
+        result = "out of time"
+
+    scene.on_exit()
+    # every node has left the game now, so nothing should hold on to
+    # the missile any more
+    if game.PlayerShoot.ACTIVE_SHOOT is not None:
+        leaks["ACTIVE_SHOOT after the game ended"] += 1
+        game.PlayerShoot.ACTIVE_SHOOT = None
+    return {"seed": seed, "score": layer.score, "frames": frames,
+            "result": result, "leaks": leaks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many Space Invaders games with bots, as fast as possible.")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--bot", choices=("random", "tracking"), default="tracking")
+    # 5 minutes of game time
+    parser.add_argument("--max-frames", type=int, default=60 * 60 * 5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    jobs = [(args.seed + i, args.bot, args.max_frames) for i in range(args.games)]
+    # "spawn" starts each worker fresh, so no OpenGL state is copied
+    # over from this process
+    context = multiprocessing.get_context("spawn")
+    start = time.perf_counter()
+    with context.Pool(args.processes, initializer=_start_worker) as pool:
+        results = pool.map(play_game, jobs)
+    elapsed = time.perf_counter() - start
+
+    frames = sum(result["frames"] for result in results)
+    print("{} games in {:.1f} s: {:.2f} games/s, {:.0f} frames/s".format(
+        len(results), elapsed, len(results) / elapsed, frames / elapsed))
+
+    scores = sorted(result["score"] for result in results)
+    print("score: min {} median {} mean {:.1f} max {}".format(
+        scores[0], statistics.median(scores), statistics.mean(scores), scores[-1]))
+    if len(scores) >= 2:
+        deciles = statistics.quantiles(scores, n=10)
+        print("score deciles: " + " ".join("{:.0f}".format(d) for d in deciles))
+    for result, count in Counter(result["result"] for result in results).most_common():
+        print("{}: {}".format(result, count))
+
+    # how many games had each leak, and in how many frames in total
+    leaks = Counter()
+    games = Counter()
+    for result in results:
+        leaks.update(result["leaks"])
+        games.update(result["leaks"].keys())
+    for leak, count in leaks.most_common():
+        print("LEAK {}: {} games, {} frames (e.g. seed {})".format(
+            leak, games[leak], count,
+            next(r["seed"] for r in results if leak in r["leaks"])))
+    sys.exit(1 if leaks else 0)
+
+
+if __name__ == "__main__":
+    main()
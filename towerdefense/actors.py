@@ -1,18 +1,10 @@
 from cocos.sprite import Sprite
 from cocos.euclid import Vector2
 from cocos.collision_model import CircleShape, AARectShape
-from cocos.actions import IntervalAction, Delay, CallFunc, MoveBy
-from pyglet.image import ImageGrid, Animation, load
+from cocos.actions import IntervalAction, CallFunc, MoveBy
+import towerdefense.rules as rules
 import math
 
-# load the sprite sheet image
-raw = load("assets/explosion.png")
-# it has 1 row and 8 columns
-seq = ImageGrid(raw, 1, 8)
-# create an animation that cycles through the frames, playing
-# each for 0.07 seconds and do NOT loop it
-explosion_img = Animation.from_image_sequence(seq, 0.07, False)
-
 
 class Actor(Sprite):
     def __init__(self, image, x, y):
@@ -36,7 +28,7 @@ class Actor(Sprite):
 # an action that tanks can perform to turn red when hit
 class Hit(IntervalAction):
     # if no duration specified, will be half a second
-    def init(self, duration=0.5):
+    def init(self, duration=rules.HIT_FLASH):
         self.duration = duration
 
     # receives the percent of the action's duration that
@@ -45,21 +37,15 @@ class Hit(IntervalAction):
         self.target.color = (255, 255 * pct_elapsed, 255 * pct_elapsed)
 
 
-class Explosion(Sprite):
-    def __init__(self, pos):
-        super().__init__(explosion_img, pos)
-        # the do() method is how sprites perform actions
-        # wait one second, then destroy yourself
-        self.do(Delay(1) + CallFunc(self.kill))
-
-
 class Enemy(Actor):
     def __init__(self, x, y, actions):
         super().__init__("tank.png", x, y)
+        # the same size the threaded mode's Simulation uses
+        self.cshape.r = rules.TANK_RADIUS
         # starts with 100 health
-        self.health = 100
+        self.health = rules.TANK_HEALTH
         # worth 20 points when destroyed
-        self.points = 20
+        self.points = rules.TANK_POINTS
         # points aren't awarded if the tank crashes into the bunker
         self.destroyed_by_player = False
         # do the action chain that came from the scenario
@@ -67,17 +53,23 @@ class Enemy(Actor):
 
     # called when a tank is destroyed
     def explode(self):
-        # add an Explosion sprite to the game at tank's current position
-        self.parent.add(Explosion(self.position))
+        # add an explosion to the game at tank's current position, plus
+        # a shower of sparks, all handled by the layer's particle systems
+        self.parent.explosions.emit(self.x, self.y, size=32)
+        self.parent.sparks.emit(self.x, self.y, count=12, speed=120, lifetime=0.5,
+                                size=3, color=(255, 200, 80, 255), fade=True)
+        self.parent.mixer.play("explosion")
         # remove itself from game
         self.kill()
 
     # called when the tank is hit by a turret
     def hit(self):
         # lose 25 health points
-        self.health -= 25
-        # perform the action to turn red
-        self.do(Hit())
+        self.health -= rules.HIT_DAMAGE
+        # perform the action to turn red, unless the game is
+        # running slowly and has turned that effect off
+        if self.parent.quality["hit_flash"]:
+            self.do(Hit())
 
         # check if out of health and still in the game
         if self.health <= 0 and self.is_running:
@@ -90,14 +82,19 @@ class Enemy(Actor):
 class Bunker(Actor):
     def __init__(self, x, y):
         super().__init__("bunker.png", x, y)
+        # like the tank, the collider size comes from rules.py
+        self.cshape.r = rules.BUNKER_RADIUS
         # the bunker has 100 health to start
-        self.health = 100
+        self.health = rules.BUNKER_HEALTH
 
     def collide(self, other):
         # did bunker collide with an Enemy object?
         if isinstance(other, Enemy):
             # reduce health by 10
-            self.health -= 10
+            self.health -= rules.BUNKER_DAMAGE
+            # chunks of concrete fly off the bunker
+            self.parent.sparks.emit(self.x, self.y, count=20, speed=90, lifetime=0.8,
+                                    size=4, color=(160, 160, 160, 255), fade=True)
             # explode the Enemy object
             other.explode()
             # check for bunker death
@@ -113,7 +110,7 @@ class Shoot(Sprite):
         # move toward enemy very quickly,
         # remove itself from game,
         # call the Enemy's hit() function
-        self.do(MoveBy(travel_path, 0.1) +
+        self.do(MoveBy(travel_path, rules.SHOT_TIME) +
                 CallFunc(self.kill) +
                 CallFunc(enemy.hit))
 
@@ -129,16 +126,14 @@ class TurretSlot:
 class Turret(Actor):
     def __init__(self, x, y):
         super().__init__("turret.png", x, y)
-        # contains a second sprite - the white range indicator circle
-        self.add(Sprite("range.png", opacity=50, scale=5))
-        # the collider is the same size as the range circle, which has
-        # been scaled to 5 times its normal size
-        self.cshape.r = self.width * 5 / 2
+        # the collider is the firing range, 5 times the turret's size.
+        # the GameLayer's RangeOverlay draws it for every turret at once
+        self.cshape.r = rules.TURRET_RANGE
         # no tank targeted... yet
         self.target = None
 
         # turrets reload every 2 seconds
-        self.period = 2.0
+        self.period = rules.TURRET_PERIOD
         # track time elapsed since last shot fired
         self.elapsed = 0.0
         # call the _shoot function every frame to see if eligible to fire
@@ -159,10 +154,14 @@ class Turret(Actor):
 
             # normalize the vector so we can adjust it by the length of
             # the turret barrels
-            pos = self.cshape.center + target_path.normalized() * 20
+            pos = self.cshape.center + target_path.normalized() * rules.BARREL_LENGTH
 
             # create a missile at the tip of the barrels
             self.parent.add(Shoot(pos, target_path, self.target))
+            # a quick muzzle flash at the barrels
+            self.parent.sparks.emit(pos.x, pos.y, count=6, speed=60, lifetime=0.15,
+                                    size=4, color=(255, 240, 180, 255), fade=True)
+            self.parent.mixer.play("shoot")
 
     # called if a tank intersects the turret's firing range circle
     def collide(self, other):
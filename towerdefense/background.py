@@ -0,0 +1,45 @@
+from cocos.cocosnode import CocosNode
+from pyglet.gl import glPushMatrix, glPopMatrix
+from pyglet.image import Texture
+import os
+
+# finished background textures, keyed by (tmx file, map layer)
+_textures = {}
+
+
+def render_map_layer(map_layer):
+    # copy every tile into one big texture, once
+    texture = Texture.create(map_layer.px_width, map_layer.px_height)
+    # the same few tiles are used over and over, only read each one once
+    tile_data = {}
+    for column in map_layer.cells:
+        for cell in column:
+            if cell.tile is None:
+                continue
+            if cell.tile.id not in tile_data:
+                tile_data[cell.tile.id] = cell.tile.image.get_image_data()
+            texture.blit_into(tile_data[cell.tile.id], cell.x, cell.y, 0)
+    return texture
+
+
+# the whole map drawn as a single textured quad, instead of one
+# sprite per 32x32 tile every frame
+class CachedBackground(CocosNode):
+    def __init__(self, texture):
+        super().__init__()
+        self.texture = texture
+
+    def draw(self):
+        glPushMatrix()
+        self.transform()
+        self.texture.blit(0, 0)
+        glPopMatrix()
+
+
+def get_cached_background(tmx_file, map_layer_name, load_map_layer):
+    # reuse the texture as long as the TMX file hasn't changed
+    key = (tmx_file, map_layer_name)
+    mtime = os.stat("assets/{}.tmx".format(tmx_file)).st_mtime_ns
+    if key not in _textures or _textures[key][0] != mtime:
+        _textures[key] = (mtime, render_map_layer(load_map_layer()))
+    return CachedBackground(_textures[key][1])
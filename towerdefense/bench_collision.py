@@ -0,0 +1,72 @@
+import argparse
+import random
+import time
+import os
+
+# no window is needed just to use the collision managers
+os.environ.setdefault("PYGLET_SHADOW_WINDOW", "0")
+
+from cocos.collision_model import CollisionManagerGrid, CircleShape
+from cocos.euclid import Vector2
+from towerdefense.collision import CollisionManagerHGrid
+from towerdefense.rules import TANK_RADIUS, BUNKER_RADIUS, TURRET_RANGE
+
+# the same 640x480 window as the game, the tank, bunker and turret
+# sizes come from the game's rules
+WIDTH, HEIGHT = 640, 480
+
+
+# just a collider, like a TurretSlot
+class Body:
+    def __init__(self, x, y, r):
+        self.cshape = CircleShape(Vector2(x, y), r)
+
+
+def frame(collman, tanks, bunker, turrets):
+    # what GameLayer.game_loop asks the collision manager every frame
+    collman.clear()
+    for tank in tanks:
+        collman.add(tank)
+    crashed = list(collman.iter_colliding(bunker))
+    # every tank in range, not only the first one, so both managers do
+    # the whole search instead of stopping at an arbitrary first tank
+    targets = [collman.objs_colliding(turret) for turret in turrets]
+    return crashed, targets
+
+
+def bench(collman, tanks, bunker, turrets, frames):
+    start = time.perf_counter()
+    for _ in range(frames):
+        result = frame(collman, tanks, bunker, turrets)
+    return (time.perf_counter() - start) / frames * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the one-level and multi-level collision grids.")
+    parser.add_argument("--tanks", type=int, default=30)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tanks = [Body(rng.uniform(0, WIDTH), rng.uniform(0, HEIGHT), TANK_RADIUS)
+             for _ in range(args.tanks)]
+    bunker = Body(48, 400, BUNKER_RADIUS)
+
+    print("{:>8} {:>12} {:>12} {:>8}".format("turrets", "grid ms", "hgrid ms", "speedup"))
+    for count in (5, 10, 20, 40, 80, 160):
+        turrets = [Body(rng.uniform(0, WIDTH), rng.uniform(0, HEIGHT), TURRET_RANGE)
+                   for _ in range(count)]
+        grid_ms, grid_result = bench(CollisionManagerGrid(0, WIDTH, 0, HEIGHT, 32, 32),
+                                     tanks, bunker, turrets, args.frames)
+        hgrid_ms, hgrid_result = bench(CollisionManagerHGrid(32), tanks, bunker, turrets,
+                                       args.frames)
+        # both have to find exactly the same collisions
+        assert set(grid_result[0]) == set(hgrid_result[0])
+        assert grid_result[1] == hgrid_result[1]
+        print("{:>8} {:>12.3f} {:>12.3f} {:>7.1f}x".format(count, grid_ms, hgrid_ms,
+                                                          grid_ms / hgrid_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import subprocess
+import statistics
+import argparse
+import sys
+import os
+
+# the most time importing the first screen may take, in milliseconds.
+# most of it is cocos itself, which imports pyglet's windowing on load
+BUDGET_MS = 600
+
+# everything the first screen needs: the entry point, and the main menu,
+# which main.py only imports once it runs (through scenecache.get_menu)
+STARTUP_MODULES = ("towerdefense.main", "towerdefense.mainmenu")
+
+# modules that should only load once the first game is built, never
+# while the menu is starting up
+DEFERRED = ("towerdefense.gamelayer", "towerdefense.scenario", "towerdefense.actors",
+            "towerdefense.pathfinding", "common.particles", "common.audio",
+            "cocos.scenes", "numpy", "pyglet.media")
+
+
+def measure():
+    # import the startup modules in a fresh interpreter with
+    # "-X importtime", which prints a line for every module imported:
+    #   import time: self [us] | cumulative | imported package
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(here),
+               # no window is needed just to import the modules
+               PYGLET_SHADOW_WINDOW="0")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                             "import " + ", ".join(STARTUP_MODULES)],
+                            cwd=here, env=env, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        sys.exit(result.stderr)
+
+    total_us = 0
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append(name.strip())
+        # a startup module's cumulative time includes everything it imported.
+        # only the top level ones count (a single space before the name),
+        # otherwise a startup module imported by another one counts twice
+        if name.strip() in STARTUP_MODULES and not name.startswith("  "):
+            total_us += int(cumulative)
+    return total_us / 1000.0, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if Tower Defense starts up too slowly.")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    # each run is a new interpreter, take the median to smooth out noise
+    runs = [measure() for _ in range(args.runs)]
+    startup_ms = statistics.median(ms for ms, _ in runs)
+    modules = runs[0][1]
+
+    failed = False
+    eager = [name for name in DEFERRED
+             if any(m == name or m.startswith(name + ".") for m in modules)]
+    if eager:
+        print("imported at startup but should be deferred: {}".format(", ".join(eager)))
+        failed = True
+    if startup_ms > args.budget_ms:
+        print("startup imports took {:.1f} ms, budget is {:.1f} ms".format(startup_ms, args.budget_ms))
+        failed = True
+    if not failed:
+        print("startup imports took {:.1f} ms (budget {:.1f} ms)".format(startup_ms, args.budget_ms))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+from cocos.collision_model import CollisionManager
+import operator
+import math
+
+
+# a collision manager for shapes of very different sizes, like 32 pixel
+# tanks next to 260 pixel turret ranges.
+#
+# CollisionManagerGrid uses one cell size for everything: a big shape
+# goes into every cell it covers, and a big query visits every one of
+# those cells. this one has several grids instead, each with cells twice
+# as big as the one before. every shape goes into exactly one cell, of
+# the grid whose cells are at least as big as the shape. a query then
+# only looks at the few cells near it in each grid that has shapes in it.
+class CollisionManagerHGrid(CollisionManager):
+    def __init__(self, cell_size=32, levels=5):
+        # cell size of every level: 32, 64, 128, 256, 512 by default
+        self.cell_sizes = [cell_size * 2 ** level for level in range(levels)]
+        # every level maps (column, row) -> list of shapes in that cell.
+        # only cells with something in them are stored
+        self.levels = [{} for _ in range(levels)]
+        # shapes too big for any level, always checked one by one
+        self.oversized = []
+        # where each object was put, so it can be found and removed
+        # even after it moved
+        self._where = {}
+
+    def _level_for(self, aabb):
+        minx, maxx, miny, maxy = aabb
+        size = max(maxx - minx, maxy - miny)
+        for level, cell_size in enumerate(self.cell_sizes):
+            if size <= cell_size:
+                return level
+        return None
+
+    def add(self, obj):
+        aabb = obj.cshape.minmax()
+        level = self._level_for(aabb)
+        if level is None:
+            self.oversized.append(obj)
+            self._where[obj] = None
+            return
+        # the cell that holds the shape's center. the shape is no bigger
+        # than a cell, so it sticks out by at most half a cell
+        cell_size = self.cell_sizes[level]
+        key = (math.floor((aabb[0] + aabb[1]) * 0.5 / cell_size),
+               math.floor((aabb[2] + aabb[3]) * 0.5 / cell_size))
+        self.levels[level].setdefault(key, []).append(obj)
+        self._where[obj] = (level, key)
+
+    def remove_tricky(self, obj):
+        where = self._where.pop(obj)
+        if where is None:
+            self.oversized.remove(obj)
+            return
+        level, key = where
+        cell = self.levels[level][key]
+        cell.remove(obj)
+        if not cell:
+            del self.levels[level][key]
+
+    def clear(self):
+        for level in self.levels:
+            level.clear()
+        self.oversized.clear()
+        self._where.clear()
+
+    def _candidates(self, aabb):
+        # every known object that might overlap the box, each one once
+        minx, maxx, miny, maxy = aabb
+        for cell_size, cells in zip(self.cell_sizes, self.levels):
+            if not cells:
+                continue
+            # shapes stick out of their cell by at most half a cell
+            half = cell_size * 0.5
+            col_lo = math.floor((minx - half) / cell_size)
+            col_hi = math.floor((maxx + half) / cell_size)
+            row_lo = math.floor((miny - half) / cell_size)
+            row_hi = math.floor((maxy + half) / cell_size)
+
+            if (col_hi - col_lo + 1) * (row_hi - row_lo + 1) <= len(cells):
+                # a small query: look up each nearby cell
+                for col in range(col_lo, col_hi + 1):
+                    for row in range(row_lo, row_hi + 1):
+                        yield from cells.get((col, row), ())
+            else:
+                # the query covers more cells than this level has shapes
+                # in, so go through the filled cells instead
+                for (col, row), objs in cells.items():
+                    if col_lo <= col <= col_hi and row_lo <= row <= row_hi:
+                        yield from objs
+        yield from self.oversized
+
+    def they_collide(self, obj1, obj2):
+        return obj1.cshape.overlaps(obj2.cshape)
+
+    def objs_colliding(self, obj):
+        return set(self.iter_colliding(obj))
+
+    def iter_colliding(self, obj):
+        shape = obj.cshape
+        for other in self._candidates(shape.minmax()):
+            if other is not obj and shape.overlaps(other.cshape):
+                yield other
+
+    def _near_box(self, shape, near_distance):
+        minx, maxx, miny, maxy = shape.minmax()
+        return (minx - near_distance, maxx + near_distance,
+                miny - near_distance, maxy + near_distance)
+
+    def any_near(self, obj, near_distance):
+        shape = obj.cshape
+        for other in self._candidates(self._near_box(shape, near_distance)):
+            if other is not obj and shape.distance(other.cshape) < near_distance:
+                return other
+        return None
+
+    def objs_near(self, obj, near_distance):
+        shape = obj.cshape
+        return {other for other in self._candidates(self._near_box(shape, near_distance))
+                if other is not obj and shape.distance(other.cshape) < near_distance}
+
+    def objs_near_wdistance(self, obj, near_distance):
+        shape = obj.cshape
+        near = []
+        for other in self._candidates(self._near_box(shape, near_distance)):
+            if other is not obj:
+                distance = shape.distance(other.cshape)
+                if distance <= near_distance:
+                    near.append((other, distance))
+        return near
+
+    def ranked_objs_near(self, obj, near_distance):
+        near = self.objs_near_wdistance(obj, near_distance)
+        near.sort(key=operator.itemgetter(1))
+        return near
+
+    def iter_all_collisions(self):
+        for obj in list(self._where):
+            for other in self.iter_colliding(obj):
+                # every pair is found from both sides, only report it once
+                if id(obj) < id(other):
+                    yield (obj, other)
+
+    def knows(self, obj):
+        return obj in self._where
+
+    def known_objs(self):
+        return set(self._where)
+
+    def objs_touching_point(self, x, y):
+        return {obj for obj in self._candidates((x, x, y, y))
+                if obj.cshape.touches_point(x, y)}
+
+    def objs_into_box(self, minx, maxx, miny, maxy):
+        box = (minx, maxx, miny, maxy)
+        return {obj for obj in self._candidates(box) if obj.cshape.fits_in_box(box)}
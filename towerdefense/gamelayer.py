@@ -5,18 +5,56 @@ from cocos.collision_model import CollisionManagerGrid
 from cocos.scenes import FadeTransition, SplitColsTransition
 from cocos.text import Label
 from cocos.actions import Delay, CallFunc
-from towerdefense.scenario import get_scenario_1
+import towerdefense.scenario as scenarios
+import towerdefense.options as options
 import towerdefense.actors as actors
-import towerdefense.mainmenu as mainmenu
+import towerdefense.rules as rules
+from common.hudtext import GlyphText
+import towerdefense.scenecache as scenecache
+from common.audio import Mixer
+from towerdefense.rangeoverlay import RangeOverlay
+from common.particles import ParticleSystem, load_frames
+from towerdefense.governor import QualityGovernor
+from towerdefense.collision import CollisionManagerHGrid
 import random
 
+# sound effects for every game, the same ones the space invaders use
+mixer = Mixer()
+mixer.load("shoot", "assets/shoot.wav")
+mixer.load("explosion", "assets/explosion.wav")
+
+# the explosion sprite sheet, loaded the first time a game starts
+_explosion_frames = None
+
+
+def get_explosion_frames():
+    global _explosion_frames
+    if _explosion_frames is None:
+        # it has 1 row and 8 columns
+        _explosion_frames = load_frames("assets/explosion.png", 1, 8)
+    return _explosion_frames
+
 
 def new_game():
-    scenario = get_scenario_1()
+    if options.threaded:
+        # the simulation steps on its own thread, only imported when it's
+        # switched on
+        from towerdefense.threadedlayer import new_threaded_game
+        return new_threaded_game()
+
+    scenario = getattr(scenarios, options.scenario_name)()
     background = scenario.get_background()
     hud = HUD()
     game_layer = GameLayer(hud, scenario)
-    return Scene(background, game_layer, hud)
+    scene = Scene(background, game_layer, hud)
+
+    if options.hot_reload:
+        # only imported when it's switched on
+        from towerdefense.hotreload import HotReloader
+        reloader = HotReloader(game_layer, background, options.scenario_name)
+        # check for edited files twice a second while the game runs
+        game_layer.schedule_interval(reloader.poll, 0.5)
+    return scene
 
 
 class GameLayer(Layer):
@@ -26,6 +64,8 @@ class GameLayer(Layer):
         super().__init__()
         self.hud = hud
         self.scenario = scenario
+        # actors play their sound effects through the shared mixer
+        self.mixer = mixer
 
         # create and add the Bunker
         self.bunker = actors.Bunker(*scenario.bunker_position)
@@ -33,10 +73,12 @@ class GameLayer(Layer):
 
         # find the window dimensions for collision grids
         w, h = director.get_window_size()
-        cell_size = 32
+        cell_size = rules.SLOT_SIZE
 
-        # collision manager for tanks/bunker
-        self.collman_enemies = CollisionManagerGrid(0, w, 0, h, cell_size, cell_size)
+        # collision manager for tanks/bunker. the turrets ask it about
+        # their big range circles, which a multi-level grid answers
+        # without visiting every small cell the circle covers
+        self.collman_enemies = CollisionManagerHGrid(cell_size)
         # and one for turret slots, which don't change
         self.collman_slots = CollisionManagerGrid(0, w, 0, h, cell_size, cell_size)
 
@@ -46,12 +88,40 @@ class GameLayer(Layer):
 
         # create properties for score and scrap
         self.score = 0
-        self.scrap = 40
+        self.scrap = rules.START_SCRAP
         self.turrets = []
+        # map cells covered by turrets, tanks can't drive through them
+        self.turret_cells = []
+
+        # draws the firing range of every turret, above the turrets
+        self.range_overlay = RangeOverlay()
+        self.add(self.range_overlay, z=1)
+
+        # explosions play the 8 sprite sheet frames for 0.07 seconds each,
+        # sparks are plain colored squares. both are drawn above everything
+        self.explosions = ParticleSystem(get_explosion_frames(), frame_duration=0.07)
+        self.sparks = ParticleSystem()
+        self.add(self.explosions, z=2)
+        self.add(self.sparks, z=2)
+
+        # lowers (and raises) the cosmetic effects to keep the frame rate
+        # steady, it never touches the simulation itself
+        self.governor = QualityGovernor(self.apply_quality)
+        self.schedule(self.governor.tick)
 
         # schedule game loop to run every frame
         self.schedule(self.game_loop)
 
+    def apply_quality(self, settings):
+        # actors check these settings for their own effects
+        self.quality = settings
+        self.explosions.density = settings["particles"]
+        self.sparks.density = settings["particles"]
+        self.range_overlay.set_quality_mode(settings["range_mode"])
+        self.hud.score_text.refresh_interval = settings["hud_interval"]
+        self.hud.scrap_text.refresh_interval = settings["hud_interval"]
+        self.mixer.max_voices = settings["max_voices"]
+
     @property
     def scrap(self):
         return self._scrap
@@ -74,8 +144,8 @@ class GameLayer(Layer):
         # get tank spawn coordinates from scenario
         spawn_x, spawn_y = self.scenario.enemy_start
         # add a little variation to starting coords
-        x = spawn_x + random.uniform(-10, 10)
-        y = spawn_y + random.uniform(-10, 10)
+        x = spawn_x + random.uniform(-rules.SPAWN_SPREAD, rules.SPAWN_SPREAD)
+        y = spawn_y + random.uniform(-rules.SPAWN_SPREAD, rules.SPAWN_SPREAD)
         # create an Enemy and give it its actions from the scenario
         self.add(actors.Enemy(x, y, self.scenario.enemy_actions))
 
@@ -104,18 +174,28 @@ class GameLayer(Layer):
             turret.collide(obj)
 
         # small probability of spawning a tank
-        if random.random() < 0.005:
+        if random.random() < rules.SPAWN_CHANCE:
             self.create_enemy()
 
+    def on_mouse_motion(self, x, y, dx, dy):
+        # in "hover" mode, show the range of the turret under the mouse
+        self.range_overlay.hover(x, y, self.collman_slots.cell_width * 0.5)
+
     def on_mouse_press(self, x, y, buttons, mod):
+        # in "selected" mode, clicking a turret shows its range
+        # instead of building another turret on top of it
+        if self.range_overlay.mode == "selected":
+            if self.range_overlay.select(x, y, self.collman_slots.cell_width * 0.5):
+                return
+
         # anything in this collision grid where the mouse
         # click happened?
         slots = self.collman_slots.objs_touching_point(x, y)
 
         # is there a slot here, and do we have at least 20 scrap?
-        if len(slots) > 0 and self.scrap >= 20:
+        if len(slots) > 0 and self.scrap >= rules.TURRET_COST:
             # spend 20 scrap
-            self.scrap -= 20
+            self.scrap -= rules.TURRET_COST
             # get the first slot by iterating the set
             slot = next(iter(slots))
             # unpack the slot collider's coords
@@ -123,13 +203,24 @@ class GameLayer(Layer):
             # add turret to list of turrets and to game layer
             self.turrets.append(turret)
             self.add(turret)
+            self.range_overlay.add_range(turret.x, turret.y, turret.cshape.r)
+
+            # tanks can't drive through the four tiles under the turret,
+            # the flow field only redoes its work if that closes off road
+            x, y = slot.cshape.center
+            half = slot.cshape.rx
+            field = self.scenario.flow_field
+            cells = [field.cell_at(x + dx, y + dy)
+                     for dx in (-half, half) for dy in (-half, half)]
+            self.turret_cells.extend(cells)
+            field.set_walkable(cells, False)
 
     def remove(self, obj):
         if obj is self.bunker:
             director.replace(SplitColsTransition(game_over()))
         elif isinstance(obj, actors.Enemy) and obj.destroyed_by_player:
             self.score += obj.points
-            self.scrap += 5
+            self.scrap += rules.KILL_SCRAP
         super().remove(obj)
 
 
@@ -139,25 +230,28 @@ class HUD(Layer):
         super().__init__()
         # get dimensions of window
         w, h = director.get_window_size()
-        # create labels for score and scrap
-        self.score_text = self._create_text(60, h - 40)
-        self.scrap_text = self._create_text(w - 60, h - 40)
-
-    def _create_text(self, x, y):
-        text = Label(font_size=18, font_name="Oswald",
-                     anchor_x="center", anchor_y="center")
+        # create text for score and scrap
+        self.score_text = self._create_text("Score: ", 60, h - 40)
+        self.scrap_text = self._create_text("Scrap: ", w - 60, h - 40)
+
+    def _create_text(self, prefix, x, y):
+        # only the number after the prefix changes during the game, so
+        # use the cached glyphs instead of a Label that lays out the
+        # whole string again every time a tank is destroyed
+        text = GlyphText(prefix, font_size=18, font_name="Oswald",
+                         anchor_x="center", anchor_y="center")
         text.position = (x, y)
         self.add(text)
         return text
 
     def update_score(self, score):
-        self.score_text.element.text = "Score: {}".format(score)
+        self.score_text.set_value(score)
 
     def update_scrap(self, scrap):
-        self.scrap_text.element.text = "Scrap: {}".format(scrap)
+        self.scrap_text.set_value(scrap)
 
 
-def game_over():
+def game_over(message=None):
     # get window dimensions
     w, h = director.get_window_size()
     # create a layer
@@ -171,13 +265,25 @@ def game_over():
                  anchor_y="center")
     # add label to layer
     layer.add(text)
+    # say why, e.g. when a network game couldn't reach the server
+    if message is not None:
+        layer.add(Label(message,
+                        position=(w * 0.5, h * 0.5 - 50),
+                        font_name="Oswald",
+                        font_size=18,
+                        # wrap long messages to fit the window
+                        width=w * 0.9,
+                        multiline=True,
+                        align="center",
+                        anchor_x="center",
+                        anchor_y="top"))
     # add layer to scene
     scene = Scene(layer)
-    # create a transition to the main menu scene
-    menu_scene = FadeTransition(mainmenu.new_menu())
-    # a function that tells the director to replace the
-    # current scene with the menu scene
-    show_menu = lambda: director.replace(menu_scene)
+    # a function that tells the director to replace the current scene
+    # with the (already built) menu scene
+    show_menu = lambda: director.replace(FadeTransition(scenecache.scenes.get_menu()))
     # wait three seconds (showing "Game Over"), then show the menu
     scene.do(Delay(3) + CallFunc(show_menu))
+    # use the wait to get the next game ready in the background
+    scenecache.scenes.prebuild_game(delay=0.5)
     return scene
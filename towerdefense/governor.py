@@ -0,0 +1,85 @@
+from collections import deque
+import numpy as np
+import time
+
+# cosmetic settings for each quality level, from best to cheapest.
+# none of these change what happens in the game, only how it looks
+# (and sounds):
+#   particles    - fraction of sparks and explosions that get emitted
+#   hit_flash    - tanks turn red when hit
+#   range_mode   - which turret ranges the RangeOverlay draws
+#   hud_interval - seconds between HUD text refreshes
+#   max_voices   - sound effects that can play at once
+QUALITY_LEVELS = (
+    {"particles": 1.0, "hit_flash": True, "range_mode": "all",
+     "hud_interval": 0.0, "max_voices": 16},
+    {"particles": 0.5, "hit_flash": True, "range_mode": "hover",
+     "hud_interval": 0.1, "max_voices": 8},
+    {"particles": 0.25, "hit_flash": False, "range_mode": "hover",
+     "hud_interval": 0.25, "max_voices": 4},
+    {"particles": 0.0, "hit_flash": False, "range_mode": "off",
+     "hud_interval": 0.5, "max_voices": 2},
+)
+
+
+# watches how much work frames take and trades looks for speed when the
+# game falls behind its frame budget, then back again once it catches up
+class QualityGovernor:
+    def __init__(self, on_change, budget=1 / 60.0, window=120, percentile=95,
+                 slow_ratio=1.1, fast_ratio=0.7, settle_time=2.0):
+        # called with the new settings dictionary whenever the level changes
+        self.on_change = on_change
+        # target seconds of work per frame
+        self.budget = budget
+        self.percentile = percentile
+        # the recent frame times, oldest drop off automatically
+        self.frame_times = deque(maxlen=window)
+        # the main thread's CPU time at the last tick
+        self._last_cpu_time = time.thread_time()
+        # hysteresis: go down a level when frames are slower than
+        # budget * slow_ratio, but only go back up when they are
+        # faster than budget * fast_ratio, so the level doesn't flicker
+        self.slow_ratio = slow_ratio
+        self.fast_ratio = fast_ratio
+        # seconds to wait after a change before judging the new level
+        self.settle_time = settle_time
+        self._settling = 0.0
+
+        self.level = 0
+        self.on_change(self.settings)
+
+    @property
+    def settings(self):
+        return QUALITY_LEVELS[self.level]
+
+    def tick(self, delta_time):
+        # scheduled every frame. a frame's time is the CPU time the main
+        # thread spent since the last tick, updating and drawing. not
+        # delta_time: with vsync on, frames never get shorter than the
+        # screen's refresh interval, however little work they need, so
+        # the game could never look fast enough to go back up a level
+        now = time.thread_time()
+        self.frame_times.append(now - self._last_cpu_time)
+        self._last_cpu_time = now
+        if self._settling > 0:
+            self._settling -= delta_time
+            return
+        # wait for a full window of frames before deciding anything
+        if len(self.frame_times) < self.frame_times.maxlen:
+            return
+
+        slowest = np.percentile(self.frame_times, self.percentile)
+        if slowest > self.budget * self.slow_ratio:
+            self._set_level(self.level + 1)
+        elif slowest < self.budget * self.fast_ratio:
+            self._set_level(self.level - 1)
+
+    def _set_level(self, level):
+        level = min(max(level, 0), len(QUALITY_LEVELS) - 1)
+        if level == self.level:
+            return
+        self.level = level
+        # start a fresh window so old frames don't count against the new level
+        self.frame_times.clear()
+        self._settling = self.settle_time
+        self.on_change(self.settings)
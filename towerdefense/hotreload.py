@@ -0,0 +1,192 @@
+from towerdefense.pathfinding import FollowFlowField, load_walkable
+from towerdefense.simulation import route_table
+import towerdefense.scenario as scenarios
+import towerdefense.actors as actors
+import importlib
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+# remembers when files were last modified and reports the ones that
+# changed since the last check. polling a couple of os.stat() calls
+# every half second is cheap and works the same on every platform
+class FileWatcher:
+    def __init__(self, paths):
+        # the modification time of the version of each file the game uses
+        self.mtimes = {path: self._mtime(path) for path in paths}
+        # the modification time of a version that failed to load, it is
+        # only tried again once the file is saved again
+        self.failed = {}
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def watch(self, path):
+        self.mtimes.setdefault(path, self._mtime(path))
+
+    def changed(self):
+        # (path, modification time) of every file saved since it was loaded
+        changed = []
+        for path, mtime in self.mtimes.items():
+            new_mtime = self._mtime(path)
+            # a file that is in the middle of being saved may briefly
+            # not exist, wait until it's back
+            if new_mtime is not None and new_mtime not in (mtime, self.failed.get(path)):
+                changed.append((path, new_mtime))
+        return changed
+
+    def loaded(self, path, mtime):
+        # only remembered once the file was read without errors
+        self.mtimes[path] = mtime
+        self.failed.pop(path, None)
+
+    def load_failed(self, path, mtime):
+        self.failed[path] = mtime
+
+
+# swaps edited maps and scenario values into a running game, only
+# redoing the parts that depend on the file that changed
+class HotReloader:
+    def __init__(self, game_layer, background, scenario_name="get_scenario_1"):
+        self.game_layer = game_layer
+        self.background = background
+        # which function in scenario.py builds this game's scenario
+        self.scenario_name = scenario_name
+        self.watcher = FileWatcher([scenarios.__file__, self._map_path()])
+
+    def _map_path(self):
+        return "assets/{}.tmx".format(self.game_layer.scenario.tmx_file_name)
+
+    def poll(self, _):
+        # scheduled on the GameLayer, so it only runs while the game does
+        for path, mtime in self.watcher.changed():
+            try:
+                if path == scenarios.__file__:
+                    self.reload_scenario()
+                elif path == self._map_path():
+                    self.reload_map()
+            except Exception:
+                # a typo in scenario.py or a map that is only half saved
+                # must not end the game. keep playing with the old version
+                # and try again the next time the file is saved
+                logger.exception("Could not reload %s, keeping the old version", path)
+                self.watcher.load_failed(path, mtime)
+            else:
+                self.watcher.loaded(path, mtime)
+
+    def reload_map(self):
+        layer = self.game_layer
+        scenario = layer.scenario
+
+        # read the new file before changing anything, so a map that
+        # can't be read leaves the game as it was
+        walkable, _ = load_walkable(scenario.tmx_file_name, scenario.map_layer_name)
+        # the cached background notices the new file and redraws itself
+        background = scenario.get_background()
+
+        # the road may have changed: hand the new tiles to the flow field,
+        # which only recomputes the routes around the cells that differ.
+        # the tanks all share the field, so they follow it right away
+        for cell in layer.turret_cells:
+            walkable[cell] = False
+        scenario.flow_field.update_walkable(walkable)
+        self._swap_background(background)
+
+    def _swap_background(self, background):
+        scene = self.background.parent
+        scene.remove(self.background)
+        # below the game layer and HUD
+        scene.add(background, z=-1)
+        self.background = background
+
+    def reload_scenario(self):
+        layer = self.game_layer
+        old = layer.scenario
+        importlib.reload(scenarios)
+        new = getattr(scenarios, self.scenario_name)()
+
+        # everything that reads files or builds objects happens before the
+        # game is changed, so a broken scenario leaves the game as it was
+        same_map = (new.tmx_file_name, new.map_layer_name) == (old.tmx_file_name, old.map_layer_name)
+        same_road = same_map and new.bunker_position == old.bunker_position
+        if not same_map:
+            background = new.get_background()
+        if same_road:
+            # same road and goal, keep the field the tanks already follow
+            new.flow_field = old.flow_field
+        else:
+            # new map or bunker: block the turret cells on the new field
+            new.flow_field.set_walkable(layer.turret_cells, False)
+        if new.turret_slots != old.turret_slots:
+            slots = [actors.TurretSlot(slot, layer.collman_slots.cell_width)
+                     for slot in new.turret_slots]
+
+        layer.scenario = new
+
+        if not same_map:
+            # a different map, start watching it instead
+            self.watcher.watch(self._map_path())
+            self._swap_background(background)
+
+        if new.bunker_position != old.bunker_position:
+            layer.bunker.position = new.bunker_position
+
+        if new.turret_slots != old.turret_slots:
+            # rebuild the clickable slots, existing turrets stay where they are
+            layer.collman_slots.clear()
+            for slot in slots:
+                layer.collman_slots.add(slot)
+
+        if not same_road:
+            # point the tanks that are already driving at the new field
+            for obj in layer.get_children():
+                if isinstance(obj, actors.Enemy):
+                    for action in obj.actions:
+                        if isinstance(action, FollowFlowField):
+                            action.flow_field = new.flow_field
+
+        # enemy_start and hand-written enemy_actions are read every time a
+        # tank spawns, so replacing the scenario is all they need
+
+
+# the same for a threaded game. its Simulation belongs to the worker
+# thread, so the files are read here and the simulation gets the new
+# scenario as a command, like a click
+class ThreadedHotReloader(HotReloader):
+    def __init__(self, game_layer, background, scenario, scenario_name="get_scenario_1"):
+        # the layer only has frames, so the scenario is kept here
+        self.scenario = scenario
+        super().__init__(game_layer, background, scenario_name)
+
+    def _map_path(self):
+        return "assets/{}.tmx".format(self.scenario.tmx_file_name)
+
+    def reload_map(self):
+        # building the scenario again picks up the edited map, the flow
+        # field cache notices the file changed
+        self._send(getattr(scenarios, self.scenario_name)())
+
+    def reload_scenario(self):
+        importlib.reload(scenarios)
+        self._send(getattr(scenarios, self.scenario_name)())
+
+    def _send(self, new):
+        # read the map and check the route on this thread, so a broken
+        # file fails here instead of stopping the simulation
+        new.flow_field
+        route_table(new.enemy_route)
+        background = new.get_background()
+
+        self.game_layer.source.send("use_scenario", new)
+        old, self.scenario = self.scenario, new
+        if new.tmx_file_name != old.tmx_file_name:
+            self.watcher.watch(self._map_path())
+        if background is not self.background:
+            self._swap_background(background)
+        self.game_layer.bunker.position = new.bunker_position
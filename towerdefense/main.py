@@ -1,8 +1,25 @@
 import pyglet.resource
 from cocos.director import director
-from towerdefense.mainmenu import new_menu
+from towerdefense.scenecache import scenes
+import towerdefense.options as options
+import sys
 
 if __name__ == "__main__":
+    # "--hot-reload" picks up edits to the maps and scenario.py while playing
+    options.hot_reload = "--hot-reload" in sys.argv
+    # "--threaded" runs the simulation on its own thread
+    options.threaded = "--threaded" in sys.argv
+    for arg in sys.argv:
+        # "--scenario=2" plays get_scenario_2() from scenario.py
+        if arg.startswith("--scenario="):
+            options.scenario_name = "get_scenario_" + arg.split("=", 1)[1]
+        # "--ranges=selected" only shows the range of the turret that was
+        # clicked, "--ranges=all", "hover" and "off" work the same way
+        if arg.startswith("--ranges="):
+            options.range_mode = arg.split("=", 1)[1]
+            if options.range_mode not in options.RANGE_MODES:
+                sys.exit("--ranges must be one of: " + ", ".join(options.RANGE_MODES))
+
     # make the assets directory known to Pyglet
     pyglet.resource.path.append("assets")
     pyglet.resource.reindex()
@@ -11,4 +28,4 @@ if __name__ == "__main__":
     pyglet.font.add_file("assets/Oswald-Regular.ttf")
 
     director.init(caption="Tower Defense")
-    director.run(new_menu())
\ No newline at end of file
+    director.run(scenes.get_menu())
\ No newline at end of file
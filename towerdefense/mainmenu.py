@@ -1,10 +1,9 @@
-from towerdefense.gamelayer import new_game
+import towerdefense.scenecache as scenecache
 from cocos.menu import Menu, MenuItem
 from cocos.scene import Scene
 from cocos.layer import ColorLayer
 from cocos.actions import ScaleTo
 from cocos.director import director
-from cocos.scenes.transitions import FadeTRTransition
 import pyglet.app
 
 
@@ -32,10 +31,20 @@ class MainMenu(Menu):
         # activated/deactivated (enlarge on hover effect)
         self.create_menu(items, ScaleTo(1.25, duration=0.25), ScaleTo(1.0, duration=0.25))
 
+    def on_enter(self):
+        super().on_enter()
+        # while the player is idling in the menu, build the game scene
+        # so "New Game" doesn't have to wait for it
+        scenecache.scenes.prebuild_game(delay=0.5)
+
     def on_new_game(self):
-        # director.push will suspend the running scene and load a new one
-        # with a 2-second wipe effect transition
-        director.push(FadeTRTransition(new_game(), duration=2))
+        # the transitions module isn't needed to show the menu
+        from cocos.scenes.transitions import FadeTRTransition
+        # director.replace loads the new scene with a 2-second wipe effect
+        # transition. the menu is cached and comes back with replace too,
+        # so it isn't kept waiting on the director's scene stack (a later
+        # pop would start the cached menu a second time)
+        director.replace(FadeTRTransition(scenecache.scenes.get_game(), duration=2))
 
 
 def new_menu():
@@ -0,0 +1,440 @@
+from collections import deque
+from towerdefense.simulation import Frame, TANK, SHOT, TURRET, TICK
+from towerdefense.rules import HIT_FLASH, BUNKER_HEALTH, START_SCRAP, TURRET_COST
+from towerdefense.simthread import FrameBuffer
+import numpy as np
+import threading
+import argparse
+import asyncio
+import logging
+import struct
+import sys
+import os
+
+logger = logging.getLogger(__name__)
+
+# co-op tower defense over a network. the server runs the only
+# Simulation. clients draw it and send their clicks as commands.
+#
+# every message is a 4 byte length and then the message itself. the
+# server sends a snapshot several times a second, and each snapshot only
+# holds what changed since the last one that client got. TCP delivers
+# everything in order, so "the last one sent" is always what the client
+# has. positions are sent in quarter pixels as 16 bit numbers and angles
+# as one byte, which is plenty to draw them.
+
+PORT = 7777
+# snapshots per second
+SNAPSHOT_RATE = 20
+LENGTH = struct.Struct("<I")
+# tick, score, scrap, bunker health, game over, then the event count
+SNAPSHOT_HEADER = struct.Struct("<Iiih?H")
+EVENT = struct.Struct("<Bhh")
+EVENT_KINDS = ("explosion", "shot", "bunker_hit")
+# positions are sent in quarter pixels
+POSITION_SCALE = 4
+# clients that fall this far behind (in unsent bytes) are disconnected
+# instead of making the server buffer everything for them
+MAX_BACKLOG = 256 * 1024
+# seconds a client waits for the server to answer before giving up
+CONNECT_TIMEOUT = 5
+
+# what is sent for each kind of entity, and how
+FIELDS = {
+    "tanks": (("x", "h"), ("y", "h"), ("rotation", "B"), ("health", "B"), ("flash", "B")),
+    "shots": (("x", "h"), ("y", "h")),
+    "turrets": (("x", "h"), ("y", "h"), ("rotation", "B")),
+}
+KINDS = (("tanks", TANK), ("shots", SHOT), ("turrets", TURRET))
+
+# commands from clients: one letter and its arguments
+COMMANDS = {"place_turret": (b"P", struct.Struct("<hh"))}
+COMMANDS_BY_CODE = {code: (name, args) for name, (code, args) in COMMANDS.items()}
+
+
+def _quantize(array, name):
+    values = array[name].astype(np.float64)
+    if name in ("x", "y"):
+        return np.round(values * POSITION_SCALE).astype(np.int64)
+    if name == "rotation":
+        return np.round(values % 360 * 256 / 360).astype(np.int64) % 256
+    if name == "flash":
+        return np.round(values / HIT_FLASH * 255).astype(np.int64)
+    return values.astype(np.int64)
+
+
+def _dequantize(value, name):
+    if name in ("x", "y"):
+        return value / POSITION_SCALE
+    if name == "rotation":
+        return value * 360 / 256
+    if name == "flash":
+        return value * HIT_FLASH / 255
+    return value
+
+
+def quantize(simulation):
+    # kind -> {id: (field values)} for everything a client can see
+    state = {}
+    for kind, _ in KINDS:
+        array = getattr(simulation, kind)
+        columns = [_quantize(array, name).tolist() for name, _ in FIELDS[kind]]
+        state[kind] = dict(zip(array["id"].tolist(), zip(*columns)))
+    return state
+
+
+def encode(baseline, state, simulation, events):
+    # a snapshot of `state` for a client that already has `baseline`
+    parts = [SNAPSHOT_HEADER.pack(simulation.tick, simulation.score, simulation.scrap,
+                                  simulation.bunker_health, simulation.game_over, len(events))]
+    for kind, x, y in events:
+        parts.append(EVENT.pack(EVENT_KINDS.index(kind), round(x), round(y)))
+
+    for kind, _ in KINDS:
+        old, new = baseline.get(kind, {}), state[kind]
+        removed = [entity_id for entity_id in old if entity_id not in new]
+        changed = []
+        for entity_id, values in new.items():
+            before = old.get(entity_id)
+            if before == values:
+                continue
+            # one bit per field that is sent, all of them for new entities
+            fields = [(i, value) for i, value in enumerate(values)
+                      if before is None or before[i] != value]
+            mask = sum(1 << i for i, _ in fields)
+            codes = "".join(FIELDS[kind][i][1] for i, _ in fields)
+            changed.append(struct.pack("<IB" + codes, entity_id, mask,
+                                       *(value for _, value in fields)))
+        parts.append(struct.pack("<H{}I".format(len(removed)), len(removed), *removed))
+        parts.append(struct.pack("<H", len(changed)))
+        parts.extend(changed)
+    return b"".join(parts)
+
+
+# the client's copy of the game, kept up to date by the snapshots
+class ClientState:
+    def __init__(self):
+        self.entities = {kind: {} for kind, _ in KINDS}
+
+    def apply(self, payload):
+        # update from one snapshot and return it as a Frame to draw
+        tick, score, scrap, bunker_health, game_over, event_count = \
+            SNAPSHOT_HEADER.unpack_from(payload)
+        offset = SNAPSHOT_HEADER.size
+        events = []
+        for _ in range(event_count):
+            kind, x, y = EVENT.unpack_from(payload, offset)
+            events.append((EVENT_KINDS[kind], x, y))
+            offset += EVENT.size
+
+        for kind, _ in KINDS:
+            entities = self.entities[kind]
+            (removed,) = struct.unpack_from("<H", payload, offset)
+            for entity_id in struct.unpack_from("<{}I".format(removed), payload, offset + 2):
+                del entities[entity_id]
+            offset += 2 + removed * 4
+
+            (changed,) = struct.unpack_from("<H", payload, offset)
+            offset += 2
+            for _ in range(changed):
+                entity_id, mask = struct.unpack_from("<IB", payload, offset)
+                offset += 5
+                fields = [i for i in range(len(FIELDS[kind])) if mask & 1 << i]
+                codes = "<" + "".join(FIELDS[kind][i][1] for i in fields)
+                values = entities.setdefault(entity_id, [0] * len(FIELDS[kind]))
+                for i, value in zip(fields, struct.unpack_from(codes, payload, offset)):
+                    values[i] = value
+                offset += struct.calcsize(codes)
+
+        return Frame(tick, *(self._array(kind, dtype) for kind, dtype in KINDS),
+                     bunker_health, score, scrap, game_over, tuple(events))
+
+    def _array(self, kind, dtype):
+        # the same arrays the Simulation has, sorted by id like there
+        entities = self.entities[kind]
+        array = np.zeros(len(entities), dtype=dtype)
+        ids = sorted(entities)
+        array["id"] = ids
+        for i, (name, _) in enumerate(FIELDS[kind]):
+            array[name] = [_dequantize(entities[entity_id][i], name) for entity_id in ids]
+        array.flags.writeable = False
+        return array
+
+    @staticmethod
+    def empty_frame():
+        # what to draw before the first snapshot arrives
+        empty = [np.zeros(0, dtype=dtype) for _, dtype in KINDS]
+        return Frame(0, *empty, BUNKER_HEALTH, 0, START_SCRAP, False, ())
+
+
+async def read_message(reader):
+    (length,) = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+    return await reader.readexactly(length)
+
+
+def write_message(writer, payload):
+    writer.write(LENGTH.pack(len(payload)) + payload)
+
+
+# one connected player or spectator
+class Connection:
+    def __init__(self, writer):
+        self.writer = writer
+        # what this client has, the next snapshot only sends the difference
+        self.baseline = {}
+        self.bytes_sent = 0
+        self.snapshots = 0
+
+
+class NetServer:
+    def __init__(self, simulation, snapshot_rate=SNAPSHOT_RATE, speed=1):
+        self.simulation = simulation
+        # simulation steps between two snapshots
+        self.snapshot_every = max(1, round(1 / (TICK * snapshot_rate)))
+        # steps per TICK of real time, more than 1 to fast forward
+        self.speed = speed
+        self.connections = []
+        # commands from every client, applied at the start of the next step
+        self.inputs = deque()
+        # effects since the last snapshot
+        self.events = []
+        # what the last snapshot held, to check clients against
+        self.last_state = {}
+
+    async def handle_client(self, reader, writer):
+        connection = Connection(writer)
+        self.connections.append(connection)
+        logger.info("client joined from %s:%s", *writer.get_extra_info("peername")[:2])
+        try:
+            while True:
+                code = await reader.readexactly(1)
+                name, args = COMMANDS_BY_CODE[code]
+                self.inputs.append((name, args.unpack(await reader.readexactly(args.size))))
+        except (asyncio.IncompleteReadError, ConnectionError, KeyError):
+            # disconnected, or sent something that isn't a command
+            pass
+        finally:
+            if connection in self.connections:
+                self.connections.remove(connection)
+            writer.close()
+            logger.info("client left: %s snapshots, %s bytes",
+                        connection.snapshots, connection.bytes_sent)
+
+    def broadcast(self):
+        state = quantize(self.simulation)
+        for connection in list(self.connections):
+            if connection.writer.transport.get_write_buffer_size() > MAX_BACKLOG:
+                self.connections.remove(connection)
+                connection.writer.close()
+                continue
+            payload = encode(connection.baseline, state, self.simulation, self.events)
+            write_message(connection.writer, payload)
+            connection.baseline = state
+            connection.bytes_sent += LENGTH.size + len(payload)
+            connection.snapshots += 1
+        self.events = []
+        self.last_state = state
+
+    async def run(self):
+        # step the game in real time until the bunker is destroyed
+        loop = asyncio.get_running_loop()
+        next_step = loop.time()
+        simulation = self.simulation
+        while not simulation.game_over:
+            for _ in range(self.speed):
+                while self.inputs:
+                    name, args = self.inputs.popleft()
+                    getattr(simulation, name)(*args)
+                simulation.step()
+                self.events.extend(simulation.events)
+                if simulation.tick % self.snapshot_every == 0 or simulation.game_over:
+                    self.broadcast()
+                if simulation.game_over:
+                    break
+            next_step += TICK
+            await asyncio.sleep(max(0.0, next_step - loop.time()))
+
+        # let the last snapshot reach everyone before closing
+        for connection in self.connections:
+            await connection.writer.drain()
+            connection.writer.close()
+
+
+# the network version of a SimulationThread: the same frames, events
+# and send(), so ThreadedGameLayer can draw a game that runs on a server.
+# the connection runs in its own asyncio loop on this thread
+class NetClient(threading.Thread):
+    def __init__(self, host, port=PORT):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.state = ClientState()
+        self.frames = FrameBuffer(ClientState.empty_frame())
+        self.events = deque()
+        self._loop = None
+        self._writer = None
+        # why the game ended, if it never got going, for the game over screen
+        self.error = None
+
+    def send(self, command, *args):
+        # called from the render thread, written from the network thread
+        if self._loop is not None:
+            code, arg_struct = COMMANDS[command]
+            message = code + arg_struct.pack(*(round(arg) for arg in args))
+            self._loop.call_soon_threadsafe(self._writer.write, message)
+
+    def pause(self):
+        # the game goes on on the server, nothing to pause
+        pass
+
+    def resume(self):
+        pass
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._writer.close)
+
+    def run(self):
+        asyncio.run(self._receive())
+
+    async def _receive(self):
+        frame = self.frames.latest()[1][0]
+        try:
+            reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), CONNECT_TIMEOUT)
+        except (OSError, asyncio.TimeoutError) as error:
+            # no server there (or it doesn't answer): say why, and end the
+            # game so the scene goes back to the menu instead of waiting
+            self.error = "Could not connect to {}:{}: {}".format(
+                self.host, self.port, str(error) or "timed out")
+            logger.error("%s", self.error)
+            self.frames.publish(frame._replace(game_over=True, events=()))
+            return
+        self._loop = asyncio.get_running_loop()
+        try:
+            while True:
+                frame = self.state.apply(await read_message(reader))
+                self.events.extend(frame.events)
+                self.frames.publish(frame)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        # the server is gone: show the game as over
+        self.frames.publish(frame._replace(game_over=True, events=()))
+
+
+def new_client_game(host, port=PORT):
+    # a game scene that draws the server's game and sends it our clicks
+    from cocos.scene import Scene
+    from towerdefense.gamelayer import HUD
+    from towerdefense.threadedlayer import ThreadedGameLayer
+    import towerdefense.scenario as scenarios
+    # the map, bunker and slots come from the same scenario as the server's
+    scenario = scenarios.get_scenario_1()
+    hud = HUD()
+    layer = ThreadedGameLayer(hud, NetClient(host, port), scenario.bunker_position)
+    return Scene(scenario.get_background(), layer, hud)
+
+
+def _new_simulation(seed=None):
+    # the server doesn't need a window, only the map data
+    os.environ.setdefault("PYGLET_SHADOW_WINDOW", "0")
+    import towerdefense.scenario as scenarios
+    from towerdefense.simulation import Simulation
+    return Simulation(scenarios.get_scenario_1(), seed)
+
+
+async def serve(host, port, speed=1):
+    server = NetServer(_new_simulation(), speed=speed)
+    async with await asyncio.start_server(server.handle_client, host, port):
+        logger.info("serving on %s:%s", host, port)
+        await server.run()
+        # give the clients a moment to hang up
+        await asyncio.sleep(0.5)
+
+
+async def self_test(seconds, speed):
+    # a server and two clients over localhost. one client builds turrets,
+    # the other only watches. at the end both must see what the server sees
+    simulation = _new_simulation(seed=1)
+    server = NetServer(simulation, speed=speed)
+    listener = await asyncio.start_server(server.handle_client, "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    run = asyncio.ensure_future(server.run())
+
+    async def client(build):
+        state = ClientState()
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        slots = iter(simulation.turret_slots)
+        code, arg_struct = COMMANDS["place_turret"]
+        received = 0
+        try:
+            while True:
+                payload = await read_message(reader)
+                received += LENGTH.size + len(payload)
+                frame = state.apply(payload)
+                if build and frame.scrap >= TURRET_COST:
+                    slot = next(slots, None)
+                    if slot is not None:
+                        writer.write(code + arg_struct.pack(slot[0] + 1, slot[1] + 1))
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        writer.close()
+        return state, received
+
+    clients = [asyncio.ensure_future(client(build)) for build in (True, False)]
+    await asyncio.sleep(seconds)
+    # stop the game and wait for the clients to read the last snapshot
+    run.cancel()
+    server.broadcast()
+    await asyncio.sleep(0.2)
+    for connection in server.connections:
+        connection.writer.close()
+    results = await asyncio.gather(*clients)
+    listener.close()
+
+    full = len(encode({}, server.last_state, simulation, []))
+    print("{} steps, {} tanks, {} turrets, score {}".format(
+        simulation.tick, len(simulation.tanks), len(simulation.turrets), simulation.score))
+    ok = True
+    for name, (state, received) in zip(("builder", "spectator"), results):
+        same = {kind: {i: tuple(v) for i, v in entities.items()}
+                for kind, entities in state.entities.items()} == server.last_state
+        ok = ok and same
+        per_second = received / (simulation.tick * TICK)
+        print("{}: {:.0f} bytes per game second, in sync: {}".format(name, per_second, same))
+    print("a full snapshot would be {} bytes, {:.0f} bytes per game second".format(
+        full, full * SNAPSHOT_RATE))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Co-op Tower Defense over the network.")
+    parser.add_argument("mode", choices=("server", "client", "test"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT)
+    # game seconds per real second, for the server and the test
+    parser.add_argument("--speed", type=int, default=1)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+    # the server and client report clients coming and going and failed
+    # connections through logging, the test prints its own results
+    if args.mode != "test":
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.mode == "server":
+        asyncio.run(serve(args.host, args.port, args.speed))
+    elif args.mode == "test":
+        sys.exit(0 if asyncio.run(self_test(args.seconds, args.speed)) else 1)
+    else:
+        # the same setup as main.py
+        import pyglet.resource
+        from cocos.director import director
+        pyglet.resource.path.append("assets")
+        pyglet.resource.reindex()
+        pyglet.font.add_file("assets/Oswald-Regular.ttf")
+        director.init(caption="Tower Defense")
+        director.run(new_client_game(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+# settings chosen on the command line in main.py. kept in their own tiny
+# module so main.py can set them without importing the rest of the game
+
+# watch the TMX maps and scenario.py and reload them into running games
+hot_reload = False
+
+# which function in scenario.py builds the game's scenario
+scenario_name = "get_scenario_1"
+
+# step the game on a worker thread and only draw on the main thread
+threaded = False
+
+# which turret ranges are drawn (see rangeoverlay.py), None lets the
+# quality governor choose
+RANGE_MODES = ("all", "hover", "selected", "off")
+range_mode = None
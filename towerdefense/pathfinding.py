@@ -0,0 +1,234 @@
+from cocos.actions import Action
+from xml.etree import ElementTree
+import towerdefense.rules as rules
+import numpy as np
+import base64
+import zlib
+import math
+import os
+
+# name of the bool tile property (set on a tile in Tiled's tileset view)
+# that marks the road the tanks drive on, every other tile is treated as
+# blocked terrain
+ROAD_PROPERTY = "road"
+
+# distance value for cells the wavefront has not reached (yet)
+UNREACHED = np.iinfo(np.int32).max
+
+# the four neighbor offsets as (column, row) steps: right, left, up, down
+NEIGHBORS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+# flow fields that have already been computed, keyed by map and goal,
+# along with the map file's modification time when it was computed
+_flow_fields = {}
+
+
+def load_tile_grid(root, map_layer):
+    # the map's parsed TMX file, see load_walkable()
+    tile_size = int(root.attrib["tilewidth"])
+
+    # find the layer with the requested name
+    layer = next(tag for tag in root.iter("layer")
+                 if tag.attrib["name"] == map_layer)
+    width, height = int(layer.attrib["width"]), int(layer.attrib["height"])
+
+    # the tile data is a zlib-compressed, base64-encoded array of
+    # little-endian 32 bit tile IDs
+    data = layer.find("data")
+    raw = base64.b64decode(data.text.strip())
+    if data.attrib.get("compression") == "zlib":
+        raw = zlib.decompress(raw)
+    tiles = np.frombuffer(raw, dtype="<u4").reshape(height, width)
+
+    # TMX rows start at the top of the map, but cocos rows start at the
+    # bottom, so flip the rows and index the grid as [column, row]
+    return np.flipud(tiles).T.copy(), tile_size
+
+
+def road_tiles(root):
+    # tile IDs with the road property, from every tileset of the map.
+    # a tileset numbers its tiles from 0, the map from the tileset's firstgid
+    road = []
+    for tileset in root.iter("tileset"):
+        first_id = int(tileset.attrib["firstgid"])
+        for tile in tileset.iter("tile"):
+            for prop in tile.iter("property"):
+                if prop.attrib["name"] == ROAD_PROPERTY and prop.attrib.get("value") == "true":
+                    road.append(first_id + int(tile.attrib["id"]))
+    return road
+
+
+class FlowField:
+    def __init__(self, walkable, goal_cell, tile_size):
+        # boolean grid indexed [column, row], True where tanks can drive
+        self.walkable = walkable.copy()
+        self.goal = goal_cell
+        self.tile_size = tile_size
+        # the goal is always reachable, even if drawn on a blocked tile
+        self.walkable[goal_cell] = True
+
+        # steps from each cell to the goal, UNREACHED if there is no route
+        self.distance = np.full(walkable.shape, UNREACHED, dtype=np.int32)
+        # (column, row) step each cell should take toward the goal
+        self.direction = np.zeros(walkable.shape + (2,), dtype=np.int8)
+
+        # run the wavefront out from the goal
+        self.distance[goal_cell] = 0
+        self._expand(0)
+
+    # tanks copy their actions with deepcopy, but they should all share
+    # this one field instead of carrying their own copy of the arrays
+    def __deepcopy__(self, memo):
+        return self
+
+    def copy(self):
+        # an independent field with the same routes, without searching again
+        field = FlowField.__new__(FlowField)
+        for name, value in self.__dict__.items():
+            setattr(field, name, value.copy() if isinstance(value, np.ndarray) else value)
+        return field
+
+    def _expand(self, level):
+        # breadth-first search, one whole "ring" of cells at a time:
+        # the frontier is every cell exactly `level` steps from the goal
+        frontier = self.distance == level
+        while frontier.any():
+            level += 1
+            # shift the frontier one cell in each direction
+            grown = np.zeros_like(frontier)
+            grown[1:, :] |= frontier[:-1, :]
+            grown[:-1, :] |= frontier[1:, :]
+            grown[:, 1:] |= frontier[:, :-1]
+            grown[:, :-1] |= frontier[:, 1:]
+            # only keep walkable cells the wave hasn't visited yet
+            frontier = grown & self.walkable & (self.distance == UNREACHED)
+            self.distance[frontier] = level
+        self._update_directions()
+
+    def _update_directions(self):
+        # pad the distances so every cell has four neighbors to look at
+        padded = np.pad(self.distance, 1, constant_values=UNREACHED)
+        cols, rows = self.distance.shape
+        # distance of each neighbor, stacked in NEIGHBORS order
+        around = np.stack([padded[1 + dx:1 + dx + cols, 1 + dy:1 + dy + rows]
+                           for dx, dy in NEIGHBORS])
+        # each cell points at its closest neighbor
+        best = np.argmin(around, axis=0)
+        self.direction = np.array(NEIGHBORS, dtype=np.int8)[best]
+        # cells with no route (and the goal itself) don't move
+        stuck = (np.min(around, axis=0) >= self.distance) | (self.distance == UNREACHED)
+        self.direction[stuck] = 0
+
+    def set_walkable(self, cells, walkable):
+        # only look at cells that actually change
+        cells = [cell for cell in cells
+                 if self.walkable[cell] != walkable and cell != self.goal]
+        if len(cells) == 0:
+            return
+
+        # cells closer to the goal than `level` can't be affected by the
+        # change, so their distances are kept and only the rest is redone
+        if walkable:
+            # opening a cell can only shorten routes through it
+            level = min(self._best_neighbor(cell) for cell in cells)
+        else:
+            # blocking a cell can only lengthen routes that went through it
+            level = min(self.distance[cell] for cell in cells)
+        level = min(level, UNREACHED - 1)
+
+        for cell in cells:
+            self.walkable[cell] = walkable
+        self.distance[self.distance > level] = UNREACHED
+        for cell in cells:
+            if not walkable:
+                self.distance[cell] = UNREACHED
+        self._expand(level)
+
+    def update_walkable(self, walkable):
+        # a whole new walkable grid, e.g. after the map file was edited
+        if walkable.shape != self.walkable.shape:
+            # the map changed size, nothing can be kept
+            self.__init__(walkable, self.goal, self.tile_size)
+            return
+        # otherwise only the cells that differ are updated
+        closed = np.argwhere(self.walkable & ~walkable)
+        opened = np.argwhere(walkable & ~self.walkable)
+        self.set_walkable([tuple(cell) for cell in closed.tolist()], False)
+        self.set_walkable([tuple(cell) for cell in opened.tolist()], True)
+
+    def _best_neighbor(self, cell):
+        # lowest distance among the cell's in-bounds neighbors
+        cols, rows = self.distance.shape
+        x, y = cell
+        return min((self.distance[x + dx, y + dy] for dx, dy in NEIGHBORS
+                    if 0 <= x + dx < cols and 0 <= y + dy < rows),
+                   default=UNREACHED)
+
+    def cell_at(self, x, y):
+        # convert pixel coordinates into a grid cell, clamped onto the map
+        cols, rows = self.distance.shape
+        col = min(max(int(x // self.tile_size), 0), cols - 1)
+        row = min(max(int(y // self.tile_size), 0), rows - 1)
+        return col, row
+
+    def cell_center(self, cell):
+        half = self.tile_size * 0.5
+        return cell[0] * self.tile_size + half, cell[1] * self.tile_size + half
+
+    def contains(self, x, y):
+        cols, rows = self.distance.shape
+        return 0 <= x < cols * self.tile_size and 0 <= y < rows * self.tile_size
+
+    def waypoint(self, x, y):
+        # the pixel position a tank at (x, y) should drive toward next
+        cell = self.cell_at(x, y)
+        # tanks that haven't entered the map yet head for the nearest cell
+        if not self.contains(x, y):
+            return self.cell_center(cell)
+        dx, dy = self.direction[cell].tolist()
+        return self.cell_center((cell[0] + dx, cell[1] + dy))
+
+
+def load_walkable(tmx_file, map_layer):
+    # parse the TMX file ourselves, we only need the tile IDs and their
+    # properties, not the textures that cocos.tiles would load
+    root = ElementTree.parse("assets/{}.tmx".format(tmx_file)).getroot()
+    tiles, tile_size = load_tile_grid(root, map_layer)
+    # True for every road tile of the map
+    return np.isin(tiles, road_tiles(root)), tile_size
+
+
+def get_flow_field(tmx_file, map_layer, goal_position):
+    # each map only needs its field computed once (until the file is
+    # edited). games change their field when turrets are placed, so each
+    # one gets its own copy, which every tank in that game then shares
+    key = (tmx_file, map_layer, tuple(goal_position))
+    mtime = os.stat("assets/{}.tmx".format(tmx_file)).st_mtime_ns
+    if key not in _flow_fields or _flow_fields[key][0] != mtime:
+        walkable, tile_size = load_walkable(tmx_file, map_layer)
+        goal = (int(goal_position[0] // tile_size), int(goal_position[1] // tile_size))
+        _flow_fields[key] = (mtime, FlowField(walkable, goal, tile_size))
+    return _flow_fields[key][1].copy()
+
+
+# an action that steers a tank along a flow field until it is destroyed
+class FollowFlowField(Action):
+    def init(self, flow_field, speed=rules.TANK_SPEED):
+        self.flow_field = flow_field
+        # pixels per second, same as the scenario's move() helper
+        self.speed = speed
+
+    def step(self, delta_time):
+        # where should the tank go next?
+        x, y = self.target.position
+        goal_x, goal_y = self.flow_field.waypoint(x, y)
+        dx, dy = goal_x - x, goal_y - y
+        distance = math.hypot(dx, dy)
+        if distance == 0:
+            return
+
+        # don't overshoot the waypoint
+        travel = min(self.speed * delta_time, distance)
+        self.target.position = (x + dx / distance * travel, y + dy / distance * travel)
+        # the tank image faces up, and cocos rotates clockwise
+        self.target.rotation = 90 - math.degrees(math.atan2(dy, dx))
@@ -0,0 +1,139 @@
+from cocos.cocosnode import CocosNode
+from pyglet.gl import GL_TRIANGLES, glPushMatrix, glPopMatrix
+import towerdefense.options as options
+import pyglet.graphics
+import numpy as np
+
+# how many straight pieces make up each circle
+SEGMENTS = 48
+# thickness of the outline in pixels
+RING_WIDTH = 2
+# same see-through white as the old range.png sprite
+RING_COLOR = (255, 255, 255, 120)
+FILL_COLOR = (255, 255, 255, 50)
+
+# which ranges are drawn:
+#   "all"      - every turret's range, filled like the old range.png sprite
+#   "hover"    - only the turret under the mouse
+#   "selected" - only the turret that was clicked
+#   "off"      - nothing
+# the player can pick one with main.py --ranges=<mode>
+MODES = options.RANGE_MODES
+
+
+def _ring(x, y, inner, outer):
+    # triangles for a circular band between two radii
+    angles = np.linspace(0, 2 * np.pi, SEGMENTS + 1)
+    cos, sin = np.cos(angles), np.sin(angles)
+    inside = np.column_stack([x + cos * inner, y + sin * inner])
+    outside = np.column_stack([x + cos * outer, y + sin * outer])
+    # two triangles per segment: (in0, out0, out1) and (in0, out1, in1)
+    return np.stack([inside[:-1], outside[:-1], outside[1:],
+                     inside[:-1], outside[1:], inside[1:]], axis=1).reshape(-1, 2)
+
+
+# draws the firing range of every turret in a single vertex list,
+# instead of one big scaled sprite per turret
+class RangeOverlay(CocosNode):
+    def __init__(self, mode="all"):
+        super().__init__()
+        self._mode = mode
+        # (x, y, radius) of every turret
+        self.ranges = []
+        # index into ranges of the hovered and selected turrets
+        self.hovered = None
+        self.selected = None
+        self.vertex_list = None
+
+    @property
+    def mode(self):
+        return self._mode
+
+    @mode.setter
+    def mode(self, mode):
+        if mode != self._mode:
+            self._mode = mode
+            self._rebuild()
+
+    def set_quality_mode(self, mode):
+        # the quality governor's mode, unless the player picked one on
+        # the command line. the governor can still turn ranges off
+        if options.range_mode is not None and mode != "off":
+            mode = options.range_mode
+        self.mode = mode
+
+    def add_range(self, x, y, radius):
+        self.ranges.append((x, y, radius))
+        self._rebuild()
+
+    def clear(self):
+        self.ranges = []
+        self.hovered = None
+        self.selected = None
+        self._rebuild()
+
+    def _index_at(self, x, y, radius):
+        # the turret whose body is under the given point, if any
+        for i, (tx, ty, _) in enumerate(self.ranges):
+            if (tx - x) ** 2 + (ty - y) ** 2 <= radius ** 2:
+                return i
+        return None
+
+    def hover(self, x, y, radius):
+        hovered = self._index_at(x, y, radius)
+        if hovered != self.hovered:
+            self.hovered = hovered
+            if self._mode == "hover":
+                self._rebuild()
+
+    def select(self, x, y, radius):
+        # clicking a turret selects it, clicking it again deselects it
+        selected = self._index_at(x, y, radius)
+        self.selected = None if selected == self.selected else selected
+        if self._mode == "selected":
+            self._rebuild()
+        return selected is not None
+
+    def _rebuild(self):
+        # only runs when turrets are added or the highlight changes,
+        # never once per frame
+        if self.vertex_list is not None:
+            self.vertex_list.delete()
+            self.vertex_list = None
+
+        if self._mode == "all":
+            shown = range(len(self.ranges))
+        elif self._mode == "hover":
+            shown = [] if self.hovered is None else [self.hovered]
+        elif self._mode == "selected":
+            shown = [] if self.selected is None else [self.selected]
+        else:
+            return
+
+        parts, colors = [], []
+        # a filled circle with an outline for each range. they all go
+        # into the same vertex list, so the GPU draws them in one call
+        for i in shown:
+            x, y, r = self.ranges[i]
+            parts.append(_ring(x, y, r - RING_WIDTH, r))
+            colors.append(RING_COLOR)
+            parts.append(_ring(x, y, 0, r - RING_WIDTH))
+            colors.append(FILL_COLOR)
+        if len(parts) == 0:
+            return
+
+        vertices = np.concatenate(parts)
+        color_data = np.concatenate([np.tile(color, (len(part), 1))
+                                     for part, color in zip(parts, colors)])
+        self.vertex_list = pyglet.graphics.vertex_list(
+            len(vertices),
+            ("v2f/static", vertices.ravel().tolist()),
+            ("c4B/static", color_data.astype(np.uint8).ravel().tolist()))
+
+    def draw(self):
+        if self.vertex_list is None:
+            return
+        glPushMatrix()
+        self.transform()
+        self.vertex_list.draw(GL_TRIANGLES)
+        glPopMatrix()
@@ -0,0 +1,45 @@
+# the numbers that decide how the game plays. the GameLayer and its
+# actors, and the Simulation behind the threaded and network modes, all
+# read them from here, so a balance change is made once for every mode
+
+# tanks drive 100 pixels per second
+TANK_SPEED = 100
+TANK_HEALTH = 100
+# score for destroying a tank
+TANK_POINTS = 20
+# half of tank.png's width
+TANK_RADIUS = 16
+
+# health a turret's missile takes from a tank
+HIT_DAMAGE = 25
+# seconds a tank stays red after being hit
+HIT_FLASH = 0.5
+
+BUNKER_HEALTH = 100
+# health the bunker loses when a tank crashes into it
+BUNKER_DAMAGE = 10
+# half of bunker.png's width
+BUNKER_RADIUS = 32
+
+# scrap a turret costs
+TURRET_COST = 20
+# seconds a turret takes to reload
+TURRET_PERIOD = 2.0
+# the firing range, 5 times turret.png's size (52 pixels) across
+TURRET_RANGE = 130
+# missiles start at the tip of the barrels
+BARREL_LENGTH = 20
+# seconds a missile takes to reach its tank
+SHOT_TIME = 0.1
+
+START_SCRAP = 40
+# scrap for destroying a tank
+KILL_SCRAP = 5
+
+# chance of a new tank every frame
+SPAWN_CHANCE = 0.005
+# tanks start up to this many pixels away from the scenario's enemy_start
+SPAWN_SPREAD = 10
+
+# turret slots are squares this size, the same as the collision grid cells
+SLOT_SIZE = 32
@@ -1,5 +1,8 @@
 import cocos.actions as action
 from cocos.tiles import load
+from towerdefense.pathfinding import get_flow_field, FollowFlowField
+from towerdefense.background import get_cached_background
+import towerdefense.rules as rules
 
 # convenience constants for turning right and left
 RIGHT = action.RotateBy(90, 1)
@@ -10,11 +13,24 @@ LEFT = action.RotateBy(-90, 1)
 def move(x, y):
     # calculate the total pixels moved, then divide by desired
     # speed of 100 pixels/second
-    duration = abs(x + y) / 100.0
+    duration = abs(x + y) / rules.TANK_SPEED
     # create a Cocos action for correct duration
     return action.MoveBy((x, y), duration=duration)
 
 
+def _route_piece(step):
+    # (seconds, x, y, degrees): how far one step of a hand-written route
+    # moves and turns a tank, and how long it takes. None for the actions
+    # the Simulation can't follow
+    if isinstance(step, action.MoveBy):
+        return step.duration, step.delta[0], step.delta[1], 0
+    if isinstance(step, action.RotateBy):
+        return step.duration, 0, 0, step.angle
+    if isinstance(step, action.Delay):
+        return step.duration, 0, 0, 0
+    return None
+
+
 class Scenario:
     def __init__(self, tmx_file, map_layer, turrets, bunker, enemy_start):
         self.tmx_file_name = tmx_file
@@ -23,14 +39,35 @@ class Scenario:
         self.bunker_position = bunker
         self.enemy_start = enemy_start
         self._enemy_actions = None
+        # the hand-written route as a list of steps, for the Simulation
+        self.enemy_route = None
+        self._flow_field = None
+
+    @property
+    def flow_field(self):
+        # shared by every tank on this map, computed the first time it's needed
+        if self._flow_field is None:
+            self._flow_field = get_flow_field(self.tmx_file_name, self.map_layer_name,
+                                              self.bunker_position)
+        return self._flow_field
+
+    @flow_field.setter
+    def flow_field(self, field):
+        self._flow_field = field
 
     @property
     def enemy_actions(self):
+        # without a hand-written route, tanks find their own way to the
+        # bunker along the map's road tiles
+        if self._enemy_actions is None:
+            return FollowFlowField(self.flow_field)
         # returns the "private" field
         return self._enemy_actions
 
     @enemy_actions.setter
     def enemy_actions(self, action_list):
+        # the same route as plain numbers, for the Simulation
+        self.enemy_route = [_route_piece(step) for step in action_list]
         # anchor the chain of actions with a 0-second delay
         self._enemy_actions = action.Delay(0)
         # chain the desired actions after the delay
@@ -39,14 +76,16 @@ class Scenario:
             self._enemy_actions += step
 
     def get_background(self):
+        # the map never changes during play, so it can be drawn once
+        # into a texture that is reused until the TMX file changes
+        return get_cached_background(self.tmx_file_name, self.map_layer_name,
+                                     self._load_map_layer)
+
+    def _load_map_layer(self):
         # load the TMX file with map info
         tmx_map_layers = load("assets/{}.tmx".format(self.tmx_file_name))
         # select the desired map layer
-        bg = tmx_map_layers[self.map_layer_name]
-        # use 100% of the layer as the viewable area
-        bg.set_view(0, 0, bg.px_width, bg.px_height)
-
-        return bg
+        return tmx_map_layers[self.map_layer_name]
 
 
 # will be called by GameLayer at game start
@@ -58,3 +97,16 @@ def get_scenario_1():
     sc = Scenario("level1", "map1", turret_slots, bunker_position, enemy_start)
     sc.enemy_actions = [RIGHT, move(640, 0), LEFT, move(0, 224), LEFT, move(-512, 0)]
     return sc
+
+
+# picked with "--scenario=2" in main.py
+def get_scenario_2():
+    # the slot at (320, 128) sits on the narrow shortcut between the two
+    # roads. a turret there closes it, and the tanks turn around and take
+    # the long way over the top of the map
+    turret_slots = [(128, 192), (288, 288), (544, 192), (320, 128)]
+    bunker_position = (608, 112)
+    enemy_start = (-80, 112)
+    sc = Scenario("level4", "map1", turret_slots, bunker_position, enemy_start)
+    # no enemy_actions, the tanks follow the road to the bunker on their own
+    return sc
@@ -0,0 +1,50 @@
+import pyglet.clock
+
+
+class SceneCache:
+    def __init__(self):
+        # the menu never changes, so it only has to be built once
+        self._menu = None
+        # a fresh game scene built ahead of time, waiting to be played
+        self._next_game = None
+
+    def get_menu(self):
+        if self._menu is None:
+            import towerdefense.mainmenu as mainmenu
+            self._menu = mainmenu.new_menu()
+        return self._menu
+
+    def get_game(self):
+        # cancel a prebuild that hasn't run yet, we need the scene now
+        pyglet.clock.unschedule(self._build_next_game)
+
+        # hand out the prebuilt scene if there is one, otherwise build it
+        scene = self._next_game
+        self._next_game = None
+        if scene is None:
+            scene = _new_game()
+        return scene
+
+    def prebuild_game(self, delay=0.0):
+        # build the next game while the player is looking at another
+        # screen, so starting it later is instant
+        if self._next_game is None:
+            pyglet.clock.unschedule(self._build_next_game)
+            pyglet.clock.schedule_once(self._build_next_game, delay)
+
+    def _build_next_game(self, _):
+        # a game scene only starts its game loop when it enters the
+        # director, so building it early doesn't run anything
+        if self._next_game is None:
+            self._next_game = _new_game()
+
+
+def _new_game():
+    # the game modules (maps, actors, numpy, audio) are only imported when
+    # the first game is built, not while the menu is starting up
+    import towerdefense.gamelayer as gamelayer
+    return gamelayer.new_game()
+
+
+# every part of the game shares one cache
+scenes = SceneCache()
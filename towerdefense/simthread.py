@@ -0,0 +1,87 @@
+from collections import deque
+from towerdefense.simulation import TICK
+import threading
+import time
+
+
+# the two newest frames the simulation published. the worker thread only
+# ever swaps in a new (previous, current) pair with one assignment, so
+# the render thread always reads two frames that belong together and
+# never sees one that is still being written
+class FrameBuffer:
+    def __init__(self, frame):
+        # (frame, time it was published)
+        self._pair = ((frame, time.perf_counter()), (frame, time.perf_counter()))
+
+    def publish(self, frame):
+        self._pair = (self._pair[1], (frame, time.perf_counter()))
+
+    def latest(self):
+        return self._pair
+
+
+# steps a Simulation at a fixed rate on its own thread, so a slow step
+# never holds up drawing and a slow draw never slows down the game
+class SimulationThread(threading.Thread):
+    def __init__(self, simulation):
+        # a daemon thread doesn't keep the program open after the window closes
+        super().__init__(daemon=True)
+        self.simulation = simulation
+        self.frames = FrameBuffer(simulation.frame())
+        # commands from the render thread, like ("place_turret", x, y).
+        # append() and popleft() on a deque are atomic, so neither side
+        # has to take a lock
+        self.inputs = deque()
+        # effects from every step, drained by the render thread, so none
+        # are missed when it draws less often than the simulation steps
+        self.events = deque()
+        # a reason the game couldn't run, for the game over screen. the
+        # simulation here always runs, only netplay's NetClient sets one
+        self.error = None
+        self._running = True
+        # cleared while the game's scene is off screen
+        self._awake = threading.Event()
+        self._awake.set()
+
+    def send(self, command, *args):
+        # called from the render thread
+        self.inputs.append((command,) + args)
+
+    def pause(self):
+        self._awake.clear()
+
+    def resume(self):
+        self._awake.set()
+
+    def stop(self):
+        self._running = False
+        self._awake.set()
+
+    def run(self):
+        next_step = time.perf_counter()
+        while self._running:
+            if not self._awake.is_set():
+                self._awake.wait()
+                # don't count the time spent paused
+                next_step = time.perf_counter()
+
+            # apply everything the player did since the last step
+            while self.inputs:
+                command, *args = self.inputs.popleft()
+                getattr(self.simulation, command)(*args)
+
+            self.simulation.step()
+            frame = self.simulation.frame()
+            self.events.extend(frame.events)
+            self.frames.publish(frame)
+            if self.simulation.game_over:
+                break
+
+            next_step += TICK
+            delay = next_step - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -0.25:
+                # far behind (the computer was busy), don't try to catch up
+                # with a burst of steps, just carry on from now
+                next_step = time.perf_counter()
@@ -0,0 +1,385 @@
+from collections import namedtuple
+from towerdefense.rules import (TANK_SPEED, TANK_HEALTH, TANK_POINTS, TANK_RADIUS, HIT_DAMAGE,
+                                HIT_FLASH, BUNKER_HEALTH, BUNKER_DAMAGE, BUNKER_RADIUS,
+                                TURRET_COST, TURRET_PERIOD, TURRET_RANGE, BARREL_LENGTH,
+                                SHOT_TIME, START_SCRAP, KILL_SCRAP, SPAWN_CHANCE, SPAWN_SPREAD,
+                                SLOT_SIZE)
+import numpy as np
+import struct
+
+# one simulation step, in seconds (60 steps per second)
+TICK = 1 / 60.0
+SLOT_HALF_SIZE = SLOT_SIZE // 2
+
+# every entity is one row in a structured numpy array. ids start at 1,
+# 0 means "no entity" (e.g. a turret without a target). a tank's age is
+# how long it has been driving, for hand-written routes
+TANK = np.dtype([("id", "<u4"), ("x", "<f4"), ("y", "<f4"), ("rotation", "<f4"),
+                 ("health", "<i2"), ("flash", "<f4"), ("age", "<f4")])
+SHOT = np.dtype([("id", "<u4"), ("x", "<f4"), ("y", "<f4"), ("vx", "<f4"), ("vy", "<f4"),
+                 ("time_left", "<f4"), ("target", "<u4")])
+TURRET = np.dtype([("id", "<u4"), ("x", "<f4"), ("y", "<f4"), ("rotation", "<f4"),
+                   ("elapsed", "<f4"), ("target", "<u4")])
+
+# the fixed part of a snapshot: magic, tick, next id, bunker health,
+# score, scrap, game over, number of tanks, shots and turrets, map
+# columns and rows, then the random generator's 128 bit state and
+# increment (as two 64 bit halves each), and its cached 32 bits
+SNAPSHOT_HEADER = struct.Struct("<4sqIhii?IIIHHQQQQ?I")
+SNAPSHOT_MAGIC = b"TDS1"
+ENTITY_ARRAYS = (("tanks", TANK), ("shots", SHOT), ("turrets", TURRET))
+MASK_64 = (1 << 64) - 1
+
+# an immutable copy of everything the renderer needs for one step.
+# events are (kind, x, y) tuples for effects: "explosion", "shot", "bunker_hit"
+Frame = namedtuple("Frame", ["tick", "tanks", "shots", "turrets", "bunker_health",
+                             "score", "scrap", "game_over", "events"])
+
+
+def _frozen(array):
+    array = array.copy()
+    array.flags.writeable = False
+    return array
+
+
+def route_table(route):
+    # a scenario's hand-written route (Scenario.enemy_route) as arrays, so
+    # every tank's place on it can be worked out at once. None when the
+    # tanks follow the flow field instead
+    if route is None:
+        return None
+    if None in route:
+        raise ValueError("the simulation can only follow routes made of MoveBy, "
+                         "RotateBy and Delay actions")
+    pieces = np.array(list(route) or [(0, 0, 0, 0)], dtype=np.float64)
+    durations, moves, turns = pieces[:, 0], pieces[:, 1:3], pieces[:, 3]
+    # where each piece starts: the time, and how far the tank has moved
+    # and turned by then
+    starts = np.concatenate([[0], np.cumsum(durations)[:-1]])
+    moved = np.concatenate([np.zeros((1, 2)), np.cumsum(moves, axis=0)[:-1]])
+    turned = np.concatenate([[0], np.cumsum(turns)[:-1]])
+    return starts, durations, moves, turns, moved, turned
+
+
+def _along_route(table, age):
+    # how far tanks of these ages have moved and turned on the route. like
+    # cocos' MoveBy and RotateBy, each piece moves and turns evenly over
+    # its duration, and tanks stay where the route ends
+    starts, durations, moves, turns, moved, turned = table
+    piece = np.maximum(np.searchsorted(starts, age, side="right") - 1, 0)
+    length = durations[piece]
+    done = np.divide(age - starts[piece], length, out=np.ones_like(age), where=length > 0)
+    done = np.clip(done, 0, 1)
+    return moved[piece] + moves[piece] * done[:, None], turned[piece] + turns[piece] * done
+
+
+# the whole tower defense game as plain data, with no sprites, actions
+# or scheduler, so it can be stepped anywhere: on a worker thread, on a
+# server, or many times over for lookahead
+class Simulation:
+    def __init__(self, scenario, seed=None):
+        self._set_scenario(scenario)
+        self.rng = np.random.Generator(np.random.PCG64(seed))
+
+        self.tick = 0
+        self.next_id = 1
+        self.bunker_health = BUNKER_HEALTH
+        self.score = 0
+        self.scrap = START_SCRAP
+        self.game_over = False
+        self.tanks = np.zeros(0, dtype=TANK)
+        self.shots = np.zeros(0, dtype=SHOT)
+        self.turrets = np.zeros(0, dtype=TURRET)
+        # effects that happened during the last step
+        self.events = []
+
+    def _set_scenario(self, scenario):
+        self.flow_field = scenario.flow_field
+        # True while the flow field is shared with a fork
+        self._shared_field = False
+        self.route = route_table(scenario.enemy_route)
+        self.bunker_position = scenario.bunker_position
+        self.enemy_start = scenario.enemy_start
+        self.turret_slots = list(scenario.turret_slots)
+
+    def use_scenario(self, scenario):
+        # an edited scenario or map, sent by the hot reloader. the tanks and
+        # turrets stay where they are, and the turrets block the new road
+        self._set_scenario(scenario)
+        cells = []
+        for x, y in self.turrets[["x", "y"]].tolist():
+            cells.extend(self._turret_cells(x, y))
+        self.flow_field.set_walkable(cells, False)
+
+    def _turret_cells(self, x, y):
+        # the four tiles under a turret
+        return [self.flow_field.cell_at(x + dx, y + dy)
+                for dx in (-SLOT_HALF_SIZE, SLOT_HALF_SIZE)
+                for dy in (-SLOT_HALF_SIZE, SLOT_HALF_SIZE)]
+
+    def _new_id(self):
+        new_id = self.next_id
+        self.next_id += 1
+        return new_id
+
+    def _own_arrays(self):
+        # copy-on-write: entity arrays that came from a snapshot or are
+        # shared with a fork are read-only, and only get copied the first
+        # time this simulation changes them
+        for name, _ in ENTITY_ARRAYS:
+            array = getattr(self, name)
+            if not array.flags.writeable:
+                setattr(self, name, array.copy())
+
+    def place_turret(self, x, y):
+        # same as clicking a turret slot in the GameLayer
+        if self.scrap < TURRET_COST or self.game_over:
+            return False
+        for slot_x, slot_y in self.turret_slots:
+            if abs(x - slot_x) <= SLOT_HALF_SIZE and abs(y - slot_y) <= SLOT_HALF_SIZE:
+                break
+        else:
+            return False
+
+        self.scrap -= TURRET_COST
+        turret = np.zeros(1, dtype=TURRET)
+        # like the Turret actor, the first shot comes after one reload
+        turret[["id", "x", "y"]] = (self._new_id(), slot_x, slot_y)
+        self.turrets = np.concatenate([self.turrets, turret])
+
+        # tanks can't drive through the four tiles under the turret
+        if self._shared_field:
+            self.flow_field = self.flow_field.copy()
+            self._shared_field = False
+        self.flow_field.set_walkable(self._turret_cells(slot_x, slot_y), False)
+        return True
+
+    def step(self):
+        # advance the game by one TICK
+        self.events = []
+        if self.game_over:
+            return
+        self.tick += 1
+        self._own_arrays()
+        self._move_tanks()
+        self._crash_into_bunker()
+        self._aim_turrets()
+        self._fire_turrets()
+        self._move_shots()
+        self._spawn()
+
+    def _waypoints(self, x, y):
+        # the flow field's waypoint() for every tank at once
+        field = self.flow_field
+        size = field.tile_size
+        cols, rows = field.distance.shape
+        col = np.clip((x // size).astype(np.int64), 0, cols - 1)
+        row = np.clip((y // size).astype(np.int64), 0, rows - 1)
+        # tanks that haven't entered the map yet head for the nearest cell
+        inside = (x >= 0) & (x < cols * size) & (y >= 0) & (y < rows * size)
+        step = field.direction[col, row] * inside[:, None]
+        return ((col + step[:, 0]) * size + size * 0.5,
+                (row + step[:, 1]) * size + size * 0.5)
+
+    def _move_tanks(self):
+        tanks = self.tanks
+        if len(tanks) == 0:
+            return
+        if self.route is not None:
+            self._follow_route(tanks)
+        else:
+            self._follow_flow_field(tanks)
+        tanks["flash"] = np.maximum(tanks["flash"] - TICK, 0)
+        tanks["age"] += TICK
+
+    def _follow_route(self, tanks):
+        # the scenario's enemy_actions, the same way the actors do them
+        age = tanks["age"].astype(np.float64)
+        before, _ = _along_route(self.route, age)
+        after, turned = _along_route(self.route, age + TICK)
+        tanks["x"] += after[:, 0] - before[:, 0]
+        tanks["y"] += after[:, 1] - before[:, 1]
+        # tanks start facing up, like the sprites
+        tanks["rotation"] = turned % 360
+
+    def _follow_flow_field(self, tanks):
+        goal_x, goal_y = self._waypoints(tanks["x"], tanks["y"])
+        dx, dy = goal_x - tanks["x"], goal_y - tanks["y"]
+        distance = np.hypot(dx, dy)
+        moving = distance > 0
+        # don't overshoot the waypoint
+        travel = np.minimum(TANK_SPEED * TICK, distance)
+        scale = np.divide(travel, distance, out=np.zeros_like(travel), where=moving)
+        tanks["x"] += dx * scale
+        tanks["y"] += dy * scale
+        # the tank image faces up, and cocos rotates clockwise
+        tanks["rotation"] = np.where(moving, 90 - np.degrees(np.arctan2(dy, dx)),
+                                     tanks["rotation"])
+
+    def _crash_into_bunker(self):
+        bx, by = self.bunker_position
+        tanks = self.tanks
+        crashed = np.hypot(tanks["x"] - bx, tanks["y"] - by) < TANK_RADIUS + BUNKER_RADIUS
+        if not crashed.any():
+            return
+        for tank in tanks[crashed]:
+            self.events.append(("explosion", float(tank["x"]), float(tank["y"])))
+            self.events.append(("bunker_hit", bx, by))
+            self.bunker_health -= BUNKER_DAMAGE
+        # crashed tanks don't give points
+        self.tanks = tanks[~crashed]
+        if self.bunker_health <= 0:
+            self.game_over = True
+
+    def _aim_turrets(self):
+        turrets, tanks = self.turrets, self.tanks
+        if len(turrets) == 0:
+            return
+        if len(tanks) == 0:
+            turrets["target"] = 0
+            return
+        # distance from every turret to every tank
+        dx = tanks["x"][None, :] - turrets["x"][:, None]
+        dy = tanks["y"][None, :] - turrets["y"][:, None]
+        in_range = np.hypot(dx, dy) < TURRET_RANGE + TANK_RADIUS
+        # each turret targets the oldest tank in range
+        has_target = in_range.any(axis=1)
+        first = np.argmax(in_range, axis=1)
+        turrets["target"] = np.where(has_target, tanks["id"][first], 0)
+        rows = np.arange(len(turrets))
+        angle = np.degrees(-np.arctan2(dy[rows, first], dx[rows, first]))
+        turrets["rotation"] = np.where(has_target, angle, turrets["rotation"])
+
+    def _fire_turrets(self):
+        turrets = self.turrets
+        reloading = turrets["elapsed"] < TURRET_PERIOD
+        turrets["elapsed"] += np.where(reloading, TICK, 0)
+        firing = ~reloading & (turrets["target"] != 0)
+        if not firing.any():
+            return
+
+        turrets["elapsed"][firing] = 0
+        new_shots = []
+        for turret in turrets[firing]:
+            target = self.tanks[self.tanks["id"] == turret["target"]][0]
+            path_x, path_y = target["x"] - turret["x"], target["y"] - turret["y"]
+            length = np.hypot(path_x, path_y) or 1
+            # the missile starts at the tip of the barrels and reaches the
+            # tank's position after SHOT_TIME
+            x = turret["x"] + path_x / length * BARREL_LENGTH
+            y = turret["y"] + path_y / length * BARREL_LENGTH
+            new_shots.append((self._new_id(), x, y, path_x / SHOT_TIME, path_y / SHOT_TIME,
+                              SHOT_TIME, turret["target"]))
+            self.events.append(("shot", float(x), float(y)))
+        self.shots = np.concatenate([self.shots, np.array(new_shots, dtype=SHOT)])
+
+    def _move_shots(self):
+        shots = self.shots
+        if len(shots) == 0:
+            return
+        shots["x"] += shots["vx"] * TICK
+        shots["y"] += shots["vy"] * TICK
+        shots["time_left"] -= TICK
+        arrived = shots["time_left"] <= 1e-6
+        for target in shots["target"][arrived]:
+            self._hit(target)
+        self.shots = shots[~arrived]
+
+    def _hit(self, tank_id):
+        # tanks that were destroyed in the meantime aren't hit again
+        index = np.flatnonzero(self.tanks["id"] == tank_id)
+        if len(index) == 0:
+            return
+        tank = self.tanks[index[0]:index[0] + 1]
+        tank["health"] -= HIT_DAMAGE
+        tank["flash"] = HIT_FLASH
+        if tank["health"][0] <= 0:
+            self.score += TANK_POINTS
+            self.scrap += KILL_SCRAP
+            self.events.append(("explosion", float(tank["x"][0]), float(tank["y"][0])))
+            self.tanks = np.delete(self.tanks, index[0])
+
+    def _spawn(self):
+        # small probability of spawning a tank
+        if self.rng.random() < SPAWN_CHANCE:
+            spawn_x, spawn_y = self.enemy_start
+            offset = self.rng.uniform(-SPAWN_SPREAD, SPAWN_SPREAD, 2)
+            tank = np.zeros(1, dtype=TANK)
+            tank[["id", "x", "y", "health"]] = (self._new_id(), spawn_x + offset[0],
+                                                spawn_y + offset[1], TANK_HEALTH)
+            self.tanks = np.concatenate([self.tanks, tank])
+
+    def frame(self):
+        # everything the renderer needs, copied so the simulation can keep
+        # changing its own arrays while the copy is being drawn
+        return Frame(self.tick, _frozen(self.tanks), _frozen(self.shots),
+                     _frozen(self.turrets), self.bunker_health, self.score, self.scrap,
+                     self.game_over, tuple(self.events))
+
+    def snapshot(self):
+        # the whole game as one compact bytes object: a header, the entity
+        # arrays exactly as they are in memory, and the walkable map as
+        # one bit per tile. the flow field itself is rebuilt from that
+        rng = self.rng.bit_generator.state
+        state, inc = rng["state"]["state"], rng["state"]["inc"]
+        walkable = self.flow_field.walkable
+        header = SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, self.tick, self.next_id, self.bunker_health, self.score,
+            self.scrap, self.game_over, len(self.tanks), len(self.shots), len(self.turrets),
+            walkable.shape[0], walkable.shape[1], state & MASK_64, state >> 64,
+            inc & MASK_64, inc >> 64, bool(rng["has_uint32"]), rng["uinteger"])
+        return b"".join([header, self.tanks.tobytes(), self.shots.tobytes(),
+                         self.turrets.tobytes(), np.packbits(walkable).tobytes()])
+
+    def restore(self, blob):
+        # go back to the moment the snapshot was taken. the entity arrays
+        # are read-only views of the blob until the next step changes them
+        (magic, self.tick, self.next_id, self.bunker_health, self.score, self.scrap,
+         self.game_over, *counts, cols, rows, state_lo, state_hi, inc_lo, inc_hi,
+         has_uint32, uinteger) = SNAPSHOT_HEADER.unpack_from(blob)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("not a tower defense snapshot")
+
+        offset = SNAPSHOT_HEADER.size
+        for (name, dtype), count in zip(ENTITY_ARRAYS, counts):
+            setattr(self, name, np.frombuffer(blob, dtype, count, offset))
+            offset += count * dtype.itemsize
+
+        self.rng.bit_generator.state = {
+            "bit_generator": "PCG64",
+            "state": {"state": state_lo | state_hi << 64, "inc": inc_lo | inc_hi << 64},
+            "has_uint32": int(has_uint32), "uinteger": uinteger}
+
+        bits = np.frombuffer(blob, np.uint8, offset=offset)
+        walkable = np.unpackbits(bits, count=cols * rows).astype(bool).reshape(cols, rows)
+        if self._shared_field:
+            self.flow_field = self.flow_field.copy()
+            self._shared_field = False
+        # only re-routes around the tiles that differ, usually none
+        self.flow_field.update_walkable(walkable)
+        self.events = []
+
+    def save(self, filename):
+        # keep a long game to carry on with later
+        with open(filename, "wb") as file:
+            file.write(self.snapshot())
+
+    def load(self, filename):
+        with open(filename, "rb") as file:
+            self.restore(file.read())
+
+    def fork(self):
+        # an independent copy to try things out on, e.g. "what happens in
+        # the next 10 seconds if a turret goes here?". nothing is copied
+        # up front: both simulations share their arrays and flow field
+        # until one of them changes them
+        fork = Simulation.__new__(Simulation)
+        fork.__dict__.update(self.__dict__)
+        for name, _ in ENTITY_ARRAYS:
+            getattr(self, name).flags.writeable = False
+        self._shared_field = fork._shared_field = True
+        fork.turret_slots = list(self.turret_slots)
+        fork.events = []
+        fork.rng = np.random.Generator(np.random.PCG64())
+        fork.rng.bit_generator.state = self.rng.bit_generator.state
+        return fork
@@ -0,0 +1,216 @@
+from cocos.scene import Scene
+from cocos.layer import Layer
+from cocos.sprite import Sprite
+from cocos.director import director
+from cocos.scenes import SplitColsTransition
+from pyglet.window import key
+from towerdefense.gamelayer import HUD, game_over, get_explosion_frames, mixer
+from towerdefense.simulation import Simulation, SLOT_HALF_SIZE
+from towerdefense.rules import TURRET_RANGE, HIT_FLASH
+from towerdefense.simthread import SimulationThread
+from towerdefense.rangeoverlay import RangeOverlay
+from common.particles import ParticleSystem
+from towerdefense.governor import QualityGovernor
+import towerdefense.scenario as scenarios
+import towerdefense.options as options
+import numpy as np
+import time
+import os
+
+# F5 saves the game here, F9 carries on from it
+SAVE_FILE = "towerdefense.sav"
+
+
+def new_threaded_game():
+    scenario = getattr(scenarios, options.scenario_name)()
+    background = scenario.get_background()
+    hud = HUD()
+    source = SimulationThread(Simulation(scenario))
+    game_layer = ThreadedGameLayer(hud, source, scenario.bunker_position)
+    scene = Scene(background, game_layer, hud)
+
+    if options.hot_reload:
+        # the same as the GameLayer's, but it sends the edited scenario
+        # to the simulation's thread
+        from towerdefense.hotreload import ThreadedHotReloader
+        reloader = ThreadedHotReloader(game_layer, background, scenario,
+                                       options.scenario_name)
+        game_layer.schedule_interval(reloader.poll, 0.5)
+    return scene
+
+
+def _interpolate(previous, current, alpha):
+    # positions and rotations of the current frame's entities, moved back
+    # towards where they were in the previous frame. ids only ever grow
+    # and removing entities keeps the order, so both arrays are sorted
+    x = current["x"].astype(np.float64)
+    y = current["y"].astype(np.float64)
+    # missiles don't turn, they have no rotation
+    turns = "rotation" in current.dtype.names
+    rotation = current["rotation"].astype(np.float64) if turns else None
+    if len(previous) == 0 or len(current) == 0:
+        return x, y, rotation
+
+    index = np.minimum(np.searchsorted(previous["id"], current["id"]), len(previous) - 1)
+    # entities that are new this frame have nothing to blend from
+    found = previous["id"][index] == current["id"]
+    before = previous[index[found]]
+    x[found] = before["x"] + (x[found] - before["x"]) * alpha
+    y[found] = before["y"] + (y[found] - before["y"]) * alpha
+    if turns:
+        # turn the short way round, e.g. from 350 to 10 degrees through 0
+        turn = (rotation[found] - before["rotation"] + 180) % 360 - 180
+        rotation[found] = before["rotation"] + turn * alpha
+    return x, y, rotation
+
+
+# draws a Simulation that runs somewhere else: on a worker thread
+# (SimulationThread) or on a server (netplay.NetClient). it never changes
+# the game itself: it reads the newest frames, draws them slightly in
+# the past so it can blend between two of them, and sends clicks to the
+# simulation as commands
+class ThreadedGameLayer(Layer):
+    is_event_handler = True
+
+    def __init__(self, hud, source, bunker_position):
+        super().__init__()
+        self.hud = hud
+        self.mixer = mixer
+        # a thread with frames, events and send()
+        self.source = source
+
+        self.bunker = Sprite("bunker.png", position=bunker_position)
+        self.add(self.bunker)
+
+        # a sprite for every tank, missile and turret in the last frame, by id
+        self.sprites = {"tanks": {}, "shots": {}, "turrets": {}}
+        self.images = {"tanks": "tank.png", "shots": "shoot.png", "turrets": "turret.png"}
+
+        self.range_overlay = RangeOverlay()
+        self.add(self.range_overlay, z=1)
+        self.explosions = ParticleSystem(get_explosion_frames(), frame_duration=0.07)
+        self.sparks = ParticleSystem()
+        self.add(self.explosions, z=2)
+        self.add(self.sparks, z=2)
+
+        self.governor = QualityGovernor(self.apply_quality)
+        self.schedule(self.governor.tick)
+        self.schedule(self.render)
+        self.ended = False
+
+    def apply_quality(self, settings):
+        # the same cosmetic settings as the GameLayer
+        self.quality = settings
+        self.explosions.density = settings["particles"]
+        self.sparks.density = settings["particles"]
+        self.range_overlay.set_quality_mode(settings["range_mode"])
+        self.hud.score_text.refresh_interval = settings["hud_interval"]
+        self.hud.scrap_text.refresh_interval = settings["hud_interval"]
+        self.mixer.max_voices = settings["max_voices"]
+
+    def on_enter(self):
+        super().on_enter()
+        # the simulation only runs while the game is on screen
+        if self.source.ident is None:
+            self.source.start()
+        else:
+            self.source.resume()
+
+    def on_exit(self):
+        super().on_exit()
+        self.source.pause()
+
+    def render(self, _):
+        (previous, previous_time), (current, current_time) = self.source.frames.latest()
+        # draw one frame interval behind the newest frame (a step for the
+        # thread, a snapshot for the network), so there are almost always
+        # two frames to blend between
+        interval = current_time - previous_time
+        if interval > 0:
+            alpha = min(max((time.perf_counter() - current_time) / interval, 0.0), 1.0)
+        else:
+            alpha = 1.0
+
+        for kind in ("tanks", "shots", "turrets"):
+            self._sync_sprites(kind, getattr(previous, kind), getattr(current, kind), alpha)
+        # tanks that were hit fade from red back to their own colors,
+        # unless the game is running slowly and has turned that effect off
+        flash = self.quality["hit_flash"]
+        for tank in current.tanks:
+            shade = 255 * (1 - tank["flash"] / HIT_FLASH) if flash else 255
+            self.sprites["tanks"][int(tank["id"])].color = (255, shade, shade)
+
+        while self.source.events:
+            self._play_effect(*self.source.events.popleft())
+        self.hud.update_score(current.score)
+        self.hud.update_scrap(current.scrap)
+
+        if current.game_over and not self.ended:
+            self.ended = True
+            self.source.stop()
+            director.replace(SplitColsTransition(game_over(self.source.error)))
+
+    def _sync_sprites(self, kind, previous, current, alpha):
+        sprites = self.sprites[kind]
+        ids = current["id"].tolist()
+
+        # remove sprites for entities that are gone
+        gone = sprites.keys() - set(ids)
+        for entity_id in gone:
+            self.remove(sprites.pop(entity_id))
+        if kind == "turrets" and len(gone) > 0:
+            # turrets only go away when an older save is loaded. start the
+            # ranges over, the loop below adds the turrets that are left
+            self.range_overlay.clear()
+            for sprite in sprites.values():
+                self.remove(sprite)
+            sprites.clear()
+
+        x, y, rotation = _interpolate(previous, current, alpha)
+        for i, entity_id in enumerate(ids):
+            sprite = sprites.get(entity_id)
+            if sprite is None:
+                sprite = sprites[entity_id] = Sprite(self.images[kind])
+                self.add(sprite)
+                if kind == "turrets":
+                    self.range_overlay.add_range(x[i], y[i], TURRET_RANGE)
+            sprite.position = (x[i], y[i])
+            if rotation is not None:
+                sprite.rotation = rotation[i]
+
+    def _play_effect(self, kind, x, y):
+        # the same effects the actors make in the GameLayer
+        if kind == "explosion":
+            self.explosions.emit(x, y, size=32)
+            self.sparks.emit(x, y, count=12, speed=120, lifetime=0.5,
+                             size=3, color=(255, 200, 80, 255), fade=True)
+            self.mixer.play("explosion")
+        elif kind == "shot":
+            self.sparks.emit(x, y, count=6, speed=60, lifetime=0.15,
+                             size=4, color=(255, 240, 180, 255), fade=True)
+            self.mixer.play("shoot")
+        elif kind == "bunker_hit":
+            self.sparks.emit(x, y, count=20, speed=90, lifetime=0.8,
+                             size=4, color=(160, 160, 160, 255), fade=True)
+
+    def on_mouse_motion(self, x, y, dx, dy):
+        self.range_overlay.hover(x, y, SLOT_HALF_SIZE)
+
+    def on_mouse_press(self, x, y, buttons, mod):
+        if self.range_overlay.mode == "selected":
+            if self.range_overlay.select(x, y, SLOT_HALF_SIZE):
+                return
+        # the simulation checks the slot and the scrap, wherever it runs
+        self.source.send("place_turret", x, y)
+
+    def on_key_press(self, symbol, modifiers):
+        # only a simulation running on this computer can be saved, not
+        # the one on a netplay server
+        if not isinstance(self.source, SimulationThread):
+            return
+        # the simulation thread takes the snapshot or restores it between
+        # two steps, like any other command
+        if symbol == key.F5:
+            self.source.send("save", SAVE_FILE)
+        elif symbol == key.F9 and os.path.exists(SAVE_FILE):
+            self.source.send("load", SAVE_FILE)